@@ -3,19 +3,33 @@ import os
 from flask import Flask
 from flask_cors import CORS
 
-from config_manager import is_cors_disabled, load_config, resolve_cors_origins
+from config_manager import (
+    get_processing_setting,
+    is_cors_disabled,
+    load_config,
+    resolve_cors_origins,
+)
 from llmath_video import load_settings
+from llmath_video.compression import register_compression
+from llmath_video.jobs import JobStore
+from llmath_video.llm_cache import configure_response_cache
+from llmath_video.rate_limit import configure_rate_limiter
 from llmath_video.logging_setup import setup_logging
 from llmath_video.processing import ProcessingService
 from llmath_video.routes import content, llm_routes, main, media
 from llmath_video.storage import (
+    ContentIndex,
     FrameStore,
     LogStore,
     SubtitleStore,
     SuggestionStore,
     SummaryStore,
+    TranscriptIndexStore,
     VideoStore,
+    configure_file_cache,
 )
+from llmath_video.uploads import UploadStore
+from llmath_video.whisper_models import configure_whisper_models
 
 
 def create_app():
@@ -36,33 +50,57 @@ def create_app():
         cors_origins = resolve_cors_origins(settings.config)
         CORS(app, resources={r"/*": {"origins": cors_origins}})
 
+    content_index = ContentIndex(
+        os.path.join(settings.dirs.state, "content.sqlite3"), settings.dirs.video
+    )
     video_store = VideoStore(
-        settings.dirs.video, settings.allowed_extensions
+        settings.dirs.video, settings.allowed_extensions, content_index
+    )
+    upload_store = UploadStore(
+        os.path.join(settings.dirs.state, "uploads.sqlite3"),
+        video_store,
+        chunk_size=int(
+            float(settings.config.get("upload_chunk_mb", 8)) * 1024 * 1024
+        ),
+        session_ttl=float(settings.config.get("upload_session_ttl_hours", 24))
+        * 3600,
     )
+    configure_file_cache(settings.config)
     subtitle_store = SubtitleStore(settings.dirs.subtitles)
     summary_store = SummaryStore(settings.dirs.summaries)
     suggestion_store = SuggestionStore(settings.dirs.suggestions)
     log_store = LogStore(settings.dirs.logs)
     frame_store = FrameStore(settings.dirs.frames)
+    transcript_index = TranscriptIndexStore(settings.dirs.index, subtitle_store)
 
-    dir_map = {
-        "video": settings.dirs.video,
-        "audio": settings.dirs.audio,
-        "subtitles": settings.dirs.subtitles,
-        "frames": settings.dirs.frames,
-        "summaries": settings.dirs.summaries,
-        "logs": settings.dirs.logs,
-        "suggestions": settings.dirs.suggestions,
-        "base": settings.base_dir,
-    }
+    dir_map = settings.dir_map()
+    configure_response_cache(
+        settings.llm_config, os.path.join(settings.dirs.cache, "llm")
+    )
+    configure_rate_limiter(settings.llm_config)
+    job_store = JobStore(
+        os.path.join(settings.dirs.state, "jobs.sqlite3"),
+        max_attempts=get_processing_setting(settings.processing_config, "max_attempts"),
+    )
     processing_service = ProcessingService(
         settings.llm_config,
         settings.config,
         dir_map,
         log_store,
         summary_store,
+        settings.processing_config,
+        job_store,
+        content_index,
+        transcript_index,
     )
+    # In "external" mode the web tier only enqueues; jobs are consumed by
+    # `python -m llmath_video.worker` processes sharing the data directory.
+    mode = str(get_processing_setting(settings.processing_config, "mode")).strip().lower()
+    if mode != "external":
+        configure_whisper_models(settings.llm_config)
+        processing_service.start()
 
+    register_compression(app, settings.config)
     main.register(app, video_store, settings.config)
     media.register(
         app,
@@ -71,6 +109,7 @@ def create_app():
         frame_store,
         dir_map,
         processing_service,
+        upload_store,
     )
     content.register(
         app,
@@ -89,6 +128,7 @@ def create_app():
         log_store,
         settings.llm_config,
         settings.config,
+        transcript_index,
     )
 
     return app
@@ -0,0 +1,121 @@
+"""
+Audio extraction throughput: seconds of audio per wall-clock second.
+
+Compares the original frame-by-frame mp3 path with the extraction engine
+in ``llmath_video.audio``::
+
+    python benchmarks/bench_extract.py lecture.mp4
+    python benchmarks/bench_extract.py --generate 1800   # synthetic 30 min track
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import av
+import numpy as np
+from av.audio.resampler import AudioResampler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llmath_video.audio import SilenceCompressor, extract_audio  # noqa: E402
+
+
+def legacy_extract(video_path: str, out_dir: str) -> str:
+    """The pre-engine implementation: default codec threading, per-frame encode."""
+    base = os.path.splitext(os.path.basename(video_path))[0]
+    out_path = os.path.join(out_dir, f"{base}.mp3")
+    in_container = av.open(video_path)
+    try:
+        audio_stream = next(s for s in in_container.streams if s.type == "audio")
+        out_container = av.open(out_path, mode="w")
+        try:
+            out_stream = out_container.add_stream("mp3", rate=16000)
+            out_stream.layout = "mono"
+            out_stream.bit_rate = 48000
+            resampler = AudioResampler(format="s16", layout="mono", rate=16000)
+            for packet in in_container.demux(audio_stream):
+                for frame in packet.decode():
+                    for rf in resampler.resample(frame) or []:
+                        for out_packet in out_stream.encode(rf):
+                            out_container.mux(out_packet)
+            for out_packet in out_stream.encode(None):
+                out_container.mux(out_packet)
+        finally:
+            out_container.close()
+    finally:
+        in_container.close()
+    return out_path
+
+
+def generate_input(path: str, seconds: int, rate: int = 44100) -> str:
+    """Stereo AAC track alternating 20 s of tones with 5 s pauses."""
+    container = av.open(path, mode="w")
+    stream = container.add_stream("aac", rate=rate)
+    stream.layout = "stereo"
+    block = rate  # one second per frame
+    t = np.arange(block) / rate
+    for sec in range(seconds):
+        tone = 0.2 * np.sin(2 * np.pi * (220 + 20 * (sec % 10)) * t)
+        if sec % 25 >= 20:
+            tone[:] = 0.0
+        samples = np.tile((tone * 32767).astype(np.int16), (2, 1)).T.reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(samples, format="s16", layout="stereo")
+        frame.sample_rate = rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+    for packet in stream.encode(None):
+        container.mux(packet)
+    container.close()
+    return path
+
+
+def probe_seconds(path: str) -> float:
+    container = av.open(path)
+    try:
+        return float(container.duration or 0) / av.time_base
+    finally:
+        container.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("video", nargs="?", help="input video or audio file")
+    parser.add_argument("--generate", type=int, default=600, help="synthetic input length, seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench-extract-") as tmp:
+        source = args.video or generate_input(os.path.join(tmp, "input.m4a"), args.generate)
+        audio_seconds = probe_seconds(source)
+        cases = [
+            ("legacy mp3 (before)", lambda out: legacy_extract(source, out)),
+            ("engine mp3", lambda out: extract_audio(source, out, tmp, "mp3")),
+            ("engine mp3 + VAD", lambda out: extract_audio(source, out, tmp, "mp3", SilenceCompressor())),
+            ("engine opus", lambda out: extract_audio(source, out, tmp, "opus")),
+            ("engine aac", lambda out: extract_audio(source, out, tmp, "aac")),
+            ("engine wav (local STT)", lambda out: extract_audio(source, out, tmp, "wav")),
+            ("engine stream copy", lambda out: extract_audio(source, out, tmp, "mp3", stream_copy=True)),
+        ]
+        print(f"input: {source} ({audio_seconds:.0f} s of audio)")
+        print(f"{'case':<26}{'best wall s':>12}{'audio s / s':>14}{'output KiB':>12}")
+        for case_idx, (label, run) in enumerate(cases):
+            best = float("inf")
+            size = 0
+            for idx in range(args.repeat):
+                out_dir = os.path.join(tmp, f"out-{case_idx}-{idx}")
+                os.makedirs(out_dir)
+                started = time.perf_counter()
+                out_path = run(out_dir)
+                best = min(best, time.perf_counter() - started)
+                size = os.path.getsize(out_path)
+            print(f"{label:<26}{best:>12.2f}{audio_seconds / best:>14.0f}{size / 1024:>12.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+"""
+Per-request latency of LLM calls with a fresh OpenAI client per call (the
+old ``get_openai_client`` behaviour) versus the shared client registry.
+
+By default requests go to a local stub of the chat completions endpoint,
+which isolates client construction and TCP connection setup. Point it at a
+real provider to include TLS handshakes::
+
+    python benchmarks/bench_llm_client.py
+    python benchmarks/bench_llm_client.py --base-url https://api.openai.com/v1 \\
+        --api-key "$VIDEOAPP_OPENAI_API_KEY" --model gpt-5-nano --requests 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llmath_video.openai_clients import OpenAIClientRegistry  # noqa: E402
+
+_RESPONSE = json.dumps(
+    {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "stub",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "ok"},
+                "finish_reason": "stop",
+            }
+        ],
+    }
+).encode("utf-8")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(_RESPONSE)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub() -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def _call(client, model: str):
+    client.chat.completions.create(
+        model=model, messages=[{"role": "user", "content": "ping"}]
+    )
+
+
+def measure(get_client, model: str, requests: int):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        _call(get_client(), model)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default=None, help="provider URL (default: local stub)")
+    parser.add_argument("--api-key", default="bench")
+    parser.add_argument("--model", default="stub")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    base_url = args.base_url or start_stub()
+    llm_config = {}
+    registry = OpenAIClientRegistry()
+
+    def fresh():
+        return OpenAI(api_key=args.api_key, base_url=base_url)
+
+    def pooled():
+        return registry.get(llm_config, base_url, args.api_key)
+
+    _call(pooled(), args.model)  # warm the shared pool once
+    for label, factory in (("fresh client", fresh), ("shared client", pooled)):
+        latencies = measure(factory, args.model, args.requests)
+        latencies.sort()
+        print(
+            f"{label:14s} mean={statistics.mean(latencies):7.2f} ms  "
+            f"p50={latencies[len(latencies) // 2]:7.2f} ms  "
+            f"p95={latencies[int(len(latencies) * 0.95) - 1]:7.2f} ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
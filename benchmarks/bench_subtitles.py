@@ -0,0 +1,135 @@
+"""
+Load time and memory of JSON subtitles versus the columnar ``.segs`` file.
+
+Writes ``--lectures`` synthetic transcripts of ``--segments`` segments
+(about 3 hours of speech by default) through ``SubtitleStore``, then in a
+fresh interpreter per format loads every lecture, keeps it open the way the
+store cache does and answers a "last 3000 characters before t" lookup::
+
+    python benchmarks/bench_subtitles.py
+    python benchmarks/bench_subtitles.py --segments 5000 --lectures 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from llmath_video.retrieval import SegmentIndex  # noqa: E402
+from llmath_video.storage import FileCache, SubtitleStore  # noqa: E402
+from llmath_video.subtitle_format import read_columnar  # noqa: E402
+
+WORDS = (
+    "функция предел производная интеграл ряд сходимость матрица вектор "
+    "определение теорема доказательство пример значит рассмотрим"
+).split()
+
+
+def rss_kb() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def make_segments(count: int, rng: random.Random) -> list:
+    segments = []
+    t = 0.0
+    for _ in range(count):
+        duration = rng.uniform(2.0, 6.5)
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18)))
+        segments.append({"start": round(t, 2), "end": round(t + duration, 2), "text": text})
+        t += duration
+    return segments
+
+
+def measure(mode: str, directory: str, lectures: int):
+    names = [f"lecture-{i}.mp4" for i in range(lectures)]
+    loaded = []
+    before = rss_kb()
+    started = time.perf_counter()
+    for name in names:
+        if mode == "json":
+            with open(os.path.join(directory, f"{name}.json"), encoding="utf-8") as f:
+                index = SegmentIndex(json.load(f)["segments"])
+        else:
+            index = SegmentIndex.from_columns(
+                read_columnar(os.path.join(directory, f"{name}.segs"))
+            )
+        loaded.append(index)
+    load_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    for index in loaded:
+        index.text_before(index.starts[len(index) // 2], 3000)
+    lookup_us = (time.perf_counter() - started) * 1e6 / len(loaded)
+    print(
+        json.dumps(
+            {
+                "load_ms": load_ms / len(loaded),
+                "lookup_us": lookup_us,
+                "rss_mb": (rss_kb() - before) / 1024,
+            }
+        )
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--segments", type=int, default=2500)
+    parser.add_argument("--lectures", type=int, default=20)
+    parser.add_argument("--mode", choices=("json", "columnar"), help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        measure(args.mode, args.dir, args.lectures)
+        return 0
+
+    directory = tempfile.mkdtemp(prefix="bench-subtitles-")
+    try:
+        store = SubtitleStore(directory, FileCache(max_bytes=0))
+        rng = random.Random(7)
+        for i in range(args.lectures):
+            store.write_segments(f"lecture-{i}.mp4", make_segments(args.segments, rng))
+        sizes = {
+            ext: os.path.getsize(os.path.join(directory, f"lecture-0.mp4.{ext}")) / 1024
+            for ext in ("json", "segs")
+        }
+        print(
+            f"{args.lectures} lectures x {args.segments} segments; "
+            f"file size json={sizes['json']:.0f} KB segs={sizes['segs']:.0f} KB"
+        )
+        for mode in ("json", "columnar"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--dir", directory,
+                 "--lectures", str(args.lectures)],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(out)
+            print(
+                f"{mode:9s} load={result['load_ms']:8.3f} ms/lecture  "
+                f"lookup={result['lookup_us']:7.1f} us  "
+                f"rss=+{result['rss_mb']:6.1f} MB"
+            )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
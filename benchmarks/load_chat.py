@@ -0,0 +1,211 @@
+"""
+Load test: many concurrent ``/api/chat`` requests against one server process.
+
+A local stub of the chat completions endpoint answers after ``--delay``
+seconds (the provider's generation time) and records how many requests it
+was serving at once. By default the app runs inside this script on
+Werkzeug's threaded server (a thread per request, like gunicorn's
+``gthread`` worker). To load the real launch profile, run the stub and the
+server separately::
+
+    python benchmarks/load_chat.py --concurrency 300
+    python benchmarks/load_chat.py --stub-only --stub-port 8765 &
+    VIDEOAPP_OPENAI_API_BASE=http://127.0.0.1:8765/v1 VIDEOAPP_OPENAI_API_KEY=stub \\
+        VIDEOAPP_GUNICORN_WORKERS=1 gunicorn -c gunicorn.conf.py "app:create_app()" &
+    python benchmarks/load_chat.py --url http://127.0.0.1:5001 \\
+        --stub-url http://127.0.0.1:8765 --concurrency 300
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LECTURE = "load-test.mp4"
+
+
+class _Stub:
+    delay = 2.0
+    active = 0
+    peak = 0
+    served = 0
+    lock = threading.Lock()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        with _Stub.lock:
+            body = json.dumps({"peak": _Stub.peak, "served": _Stub.served})
+            if self.path.endswith("reset"):
+                _Stub.peak = _Stub.served = 0
+        self._send(body.encode("utf-8"))
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with _Stub.lock:
+            _Stub.active += 1
+            _Stub.peak = max(_Stub.peak, _Stub.active)
+        try:
+            time.sleep(_Stub.delay)
+        finally:
+            with _Stub.lock:
+                _Stub.active -= 1
+                _Stub.served += 1
+        body = {
+            "id": "chatcmpl-load",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "stub",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "ok"},
+                    "finish_reason": "stop",
+                }
+            ],
+        }
+        self._send(json.dumps(body).encode("utf-8"))
+
+    def _send(self, body: bytes):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", port), _StubHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_app(stub_url: str) -> str:
+    os.environ.update(
+        {
+            "VIDEOAPP_OPENAI_API_BASE": f"{stub_url}/v1",
+            "VIDEOAPP_OPENAI_API_KEY": "stub",
+            "VIDEOAPP_LLM_CACHE_ENABLED": "false",
+            "VIDEOAPP_PROCESSING_MODE": "external",
+        }
+    )
+    sys.path.insert(0, ROOT)
+    import logging
+
+    from werkzeug.serving import make_server
+
+    from app import create_app
+
+    app = create_app()
+    logging.getLogger("llmath_video").setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def _get_json(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def _chat(url: str, index: int) -> tuple[float, bool]:
+    body = json.dumps(
+        {
+            "name": LECTURE,
+            "currentTime": 0,
+            "question": f"question {index}",
+            "no_cache": True,
+        }
+    ).encode("utf-8")
+    req = urllib.request.Request(
+        f"{url}/api/chat",
+        data=body,
+        headers={"Content-Type": "application/json"},
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=300) as response:
+            ok = json.loads(response.read()).get("answer") == "ok"
+    except Exception:
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def run(url: str, stub_url: str, concurrency: int, requests: int, delay: float):
+    _get_json(f"{stub_url}/stats/reset")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: _chat(url, i), range(requests)))
+    elapsed = time.perf_counter() - started
+    stub = _get_json(f"{stub_url}/stats")
+    latencies = sorted(latency for latency, _ in results)
+    failed = sum(1 for _, ok in results if not ok)
+    print(
+        f"requests={requests} concurrency={concurrency} upstream_delay={delay:.1f}s\n"
+        f"elapsed={elapsed:.2f}s  throughput={requests / elapsed:.1f} req/s  "
+        f"failed={failed}\n"
+        f"latency mean={statistics.mean(latencies):.2f}s  "
+        f"p50={latencies[len(latencies) // 2]:.2f}s  "
+        f"p95={latencies[max(0, int(len(latencies) * 0.95) - 1)]:.2f}s  "
+        f"max={latencies[-1]:.2f}s\n"
+        f"peak in-flight provider calls={stub['peak']}"
+    )
+    try:
+        urllib.request.urlopen(
+            urllib.request.Request(f"{url}/logs/{LECTURE}", method="DELETE"), timeout=30
+        ).close()
+    except Exception:
+        pass
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=None, help="running server (default: in-process)")
+    parser.add_argument("--stub-url", default=None, help="stub started with --stub-only")
+    parser.add_argument("--stub-only", action="store_true", help="only run the stub")
+    parser.add_argument("--stub-port", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=300)
+    parser.add_argument("--requests", type=int, default=0, help="default: --concurrency")
+    parser.add_argument("--delay", type=float, default=2.0, help="stub answer delay, s")
+    args = parser.parse_args()
+
+    _Stub.delay = args.delay
+    if args.stub_only:
+        _, stub_url = start_stub(args.stub_port)
+        print(f"stub listening on {stub_url}/v1", flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    stub_url = args.stub_url
+    if not stub_url:
+        _, stub_url = start_stub(args.stub_port)
+    url = args.url or start_app(stub_url)
+    requests = args.requests or args.concurrency
+    return run(url.rstrip("/"), stub_url.rstrip("/"), args.concurrency, requests, args.delay)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -25,6 +25,48 @@ LLM_DEFAULTS = {
     "whisper_language": "ru",
     "stt_mode": "api",
     "whisper_local_model": "base",
+    "whisper_cache_models": "1",
+    "whisper_cache_memory_mb": "0",
+    "whisper_warmup": "false",
+    "whisper_processes": "0",
+    "whisper_threads_per_process": "0",
+    "stt_chunk_seconds": "600",
+    "stt_chunk_overlap_seconds": "5",
+    "stt_parallelism": "4",
+    "summary_chunk_chars": "12000",
+    "summary_parallelism": "4",
+    "openai_timeout_seconds": "300",
+    "openai_connect_timeout_seconds": "10",
+    "openai_max_connections": "256",
+    "openai_keepalive_connections": "16",
+    "openai_keepalive_seconds": "90",
+    "llm_rpm": "0",
+    "llm_tpm": "0",
+    "llm_interactive_reserve": "0.2",
+    "llm_max_retries": "5",
+    "llm_backoff_seconds": "1",
+    "llm_backoff_max_seconds": "30",
+    "llm_cache_enabled": "true",
+    "llm_cache_ttl_seconds": "604800",
+    "llm_cache_max_mb": "512",
+}
+
+PROCESSING_DEFAULTS = {
+    "mode": "inline",
+    "workers": 4,
+    "cpu_concurrency": 2,
+    "network_concurrency": 4,
+    "lease_seconds": 120.0,
+    "poll_interval": 2.0,
+    "max_attempts": 3,
+    "vad_enabled": True,
+    "vad_threshold_db": -45.0,
+    "vad_min_silence_seconds": 2.0,
+    "vad_keep_silence_seconds": 0.5,
+    "audio_codec": "mp3",
+    "audio_stream_copy": False,
+    "stage_retries": 1,
+    "stage_retry_delay": 5.0,
 }
 
 DATA_SUBDIRS = {
@@ -35,6 +77,9 @@ DATA_SUBDIRS = {
     "summaries": ("data", "summaries"),
     "logs": ("data", "logs"),
     "suggestions": ("data", "suggestions"),
+    "state": ("data", "state"),
+    "cache": ("data", "cache"),
+    "index": ("data", "index"),
 }
 
 PROMPT_DEFAULTS = {
@@ -67,6 +112,17 @@ PROMPT_DEFAULTS = {
         "- Без дополнительного текста, без комментариев и пояснений. Только JSON.\n\n"
         "Транскрипт с тайм-кодами:\n{timecoded_transcript}"
     ),
+    "summary_map": (
+        "Ты опытный лектор. Ниже фрагмент {part} из {parts} транскрипта лекции. "
+        "Кратко законспектируй его: перечисли разобранные темы, определения, "
+        "утверждения и примеры, сохраняя порядок изложения. Ответ на русском языке. "
+        "Фрагмент:\n\n{transcript}"
+    ),
+    "summary_reduce": (
+        "Ниже конспекты последовательных частей одной лекции. Объедини их в один "
+        "связный конспект, сохранив порядок тем и убрав повторы. Ответ на русском "
+        "языке.\n\n{summaries}"
+    ),
     "chat_user_template": (
         "Лекция: {lecture}\nКраткое содержание: {summary}\n\n"
         "Мы находимся в разделе:\n{context}\n\n"
@@ -133,6 +189,49 @@ def get_llm_setting(
     return str(value)
 
 
+def build_processing_config(
+    config: Mapping[str, Any],
+    env: Optional[MutableMapping[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    Merge environment overrides with the "processing" section of config.json.
+    """
+    source_env = env or os.environ
+    section = config.get("processing") if config else None
+    if not isinstance(section, Mapping):
+        section = {}
+    processing_config: Dict[str, Any] = {}
+    for key, default in PROCESSING_DEFAULTS.items():
+        env_key = f"VIDEOAPP_PROCESSING_{key.upper()}"
+        value = source_env.get(env_key)
+        if value is None:
+            value = section.get(key, default)
+        processing_config[key] = value
+    return processing_config
+
+
+def get_processing_setting(processing_config: Mapping[str, Any], key: str) -> Any:
+    """
+    Retrieve a processing setting coerced to the type of its default value.
+    """
+    default = PROCESSING_DEFAULTS.get(key)
+    value = processing_config.get(key) if processing_config else None
+    if value in (None, ""):
+        return default
+    try:
+        if isinstance(default, bool):
+            if isinstance(value, str):
+                return value.strip().lower() in {"1", "true", "yes", "on"}
+            return bool(value)
+        if isinstance(default, int):
+            return int(value)
+        if isinstance(default, float):
+            return float(value)
+    except (TypeError, ValueError):
+        return default
+    return value
+
+
 def get_prompt_template(config: Mapping[str, Any], key: str) -> str:
     """
     Retrieve prompt templates with defaults centralized in this module.
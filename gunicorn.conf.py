@@ -0,0 +1,37 @@
+"""
+Gunicorn launch profile::
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+LLM-bound routes (``/api/chat``, ``/api/explain_frame``, their ``/stream``
+variants and on-demand ``/suggestions``) spend 5-30 s waiting on the
+provider. Under sync workers each such request holds a whole process; here
+it holds a thread (``gthread``, the default) or a greenlet (``gevent``), so
+one process keeps hundreds of chats in flight. Every value can be
+overridden with ``VIDEOAPP_GUNICORN_<KEY>``.
+"""
+
+import os
+
+
+def _env(key: str, default: str) -> str:
+    return os.environ.get(f"VIDEOAPP_GUNICORN_{key}", default)
+
+
+bind = _env("BIND", f"0.0.0.0:{os.environ.get('PORT', '5001')}")
+worker_class = _env("WORKER_CLASS", "gthread")
+workers = int(_env("WORKERS", "2"))
+# gthread: requests served concurrently per process.
+threads = int(_env("THREADS", "256"))
+# gevent: open connections per process.
+worker_connections = int(_env("WORKER_CONNECTIONS", "1000"))
+# Long completions and SSE streams must outlive the worker timeout.
+timeout = int(_env("TIMEOUT", "330"))
+graceful_timeout = int(_env("GRACEFUL_TIMEOUT", "60"))
+keepalive = int(_env("KEEPALIVE", "5"))
+accesslog = _env("ACCESSLOG", "-")
+
+if worker_class == "gevent":
+    # CPU-bound stages (ffmpeg, local whisper) would stall every greenlet of
+    # the process; leave them to `python -m llmath_video.worker`.
+    os.environ.setdefault("VIDEOAPP_PROCESSING_MODE", "external")
@@ -0,0 +1,666 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import struct
+import uuid
+import wave
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import av
+import numpy as np
+from av.audio.resampler import AudioResampler
+
+SAMPLE_RATE = 16000
+
+# Output codec -> file extension of the extracted audio artifact.
+AUDIO_CODEC_EXTENSIONS = {"mp3": "mp3", "aac": "m4a", "opus": "ogg", "pcm": "wav"}
+# Source codecs the STT APIs accept as-is, and the container they are
+# remuxed into on the stream-copy fast path.
+STREAM_COPY_EXTENSIONS = {"mp3": "mp3", "aac": "m4a", "opus": "ogg", "vorbis": "ogg"}
+_ENCODERS = {"mp3": "mp3", "aac": "aac", "opus": "libopus"}
+_BIT_RATES = {"mp3": 48000, "aac": 48000, "opus": 24000}
+# Speech for STT does not need the encoders' slowest quality searches.
+_ENCODER_OPTIONS = {"mp3": {"compression_level": "7"}, "opus": {"compression_level": "0"}}
+
+
+@dataclass(frozen=True)
+class AudioChunk:
+    """
+    A slice of the source audio sent to STT as one request.
+
+    ``start``/``end`` include the overlap with neighbouring chunks;
+    ``keep_start``/``keep_end`` is the part this chunk is authoritative for
+    when segments are stitched back together.
+    """
+
+    index: int
+    start: float
+    end: float
+    keep_start: float
+    keep_end: float
+
+
+def _open_audio_stream(container):
+    for stream in container.streams:
+        if stream.type == "audio":
+            return stream
+    raise RuntimeError("No audio stream found in input")
+
+
+def is_pcm_wav(audio_path) -> bool:
+    return isinstance(audio_path, str) and audio_path.lower().endswith(".wav")
+
+
+def open_pcm_wav(audio_path: str) -> np.ndarray:
+    """
+    Memory-map the samples of a mono 16-bit PCM WAV file without decoding.
+    """
+    with open(audio_path, "rb") as f:
+        riff, _, fmt = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or fmt != b"WAVE":
+            raise RuntimeError(f"Not a WAV file: {audio_path}")
+        channels = bits = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise RuntimeError(f"No data chunk in {audio_path}")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt_data = f.read(size)
+                channels, _, _, _, bits = struct.unpack("<HIIHH", fmt_data[2:16])
+                continue
+            if chunk_id == b"data":
+                offset = f.tell()
+                break
+            f.seek(size + (size & 1), os.SEEK_CUR)
+    if channels != 1 or bits != 16:
+        raise RuntimeError(f"Expected mono 16-bit PCM in {audio_path}")
+    count = min(size, os.path.getsize(audio_path) - offset) // 2
+    if count <= 0:
+        return np.zeros(0, dtype="<i2")
+    return np.memmap(audio_path, dtype="<i2", mode="r", offset=offset, shape=(count,))
+
+
+def load_pcm_float(audio_path: str) -> np.ndarray:
+    """
+    Whisper-ready float32 samples from a PCM WAV artifact.
+    """
+    return open_pcm_wav(audio_path).astype(np.float32) / 32768.0
+
+
+class PcmWavWriter:
+    """
+    Streams mono int16 samples into a WAV file; the header is finalized
+    on ``close``.
+    """
+
+    def __init__(self, path: str, rate: int = SAMPLE_RATE):
+        self._wav = wave.open(path, "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(rate)
+
+    def write(self, samples: np.ndarray):
+        if samples.size:
+            self._wav.writeframes(samples.astype("<i2", copy=False).tobytes())
+
+    def close(self):
+        self._wav.close()
+
+
+def iter_pcm_blocks(
+    audio_path: str, start: float = 0.0, rate: int = SAMPLE_RATE
+) -> Iterator[Tuple[float, np.ndarray]]:
+    """
+    Decode ``audio_path`` from ``start`` seconds as mono int16 blocks.
+    Yields ``(block_start_seconds, samples)`` pairs in stream order.
+    PCM WAV artifacts are sliced from a memory map instead of decoded.
+    """
+    if is_pcm_wav(audio_path):
+        pcm = open_pcm_wav(audio_path)
+        block = rate * 10
+        pos = max(0, int(start * rate))
+        while pos < pcm.size:
+            yield pos / float(rate), np.asarray(pcm[pos:pos + block])
+            pos += block
+        return
+    container = av.open(audio_path)
+    try:
+        stream = _open_audio_stream(container)
+        if start > 0:
+            container.seek(int(start * av.time_base), any_frame=False)
+        resampler = AudioResampler(format="s16", layout="mono", rate=rate)
+        position: Optional[float] = None
+
+        def _emit(frames):
+            nonlocal position
+            for rf in frames or []:
+                samples = rf.to_ndarray().reshape(-1)
+                if not samples.size:
+                    continue
+                yield position, samples
+                position += samples.size / float(rate)
+
+        for frame in container.decode(stream):
+            if position is None:
+                position = float(frame.time) if frame.time is not None else 0.0
+            yield from _emit(resampler.resample(frame))
+        if position is not None:
+            yield from _emit(resampler.resample(None))
+    finally:
+        container.close()
+
+
+def read_pcm(
+    audio_path: str, start: float, end: float, rate: int = SAMPLE_RATE
+) -> np.ndarray:
+    """
+    Return mono float32 samples in [-1, 1] for the ``[start, end)`` window.
+    """
+    if is_pcm_wav(audio_path):
+        pcm = open_pcm_wav(audio_path)
+        lo = max(0, int(round(start * rate)))
+        hi = max(lo, int(round(end * rate)))
+        return pcm[lo:hi].astype(np.float32) / 32768.0
+    parts: List[np.ndarray] = []
+    first: Optional[float] = None
+    for block_start, samples in iter_pcm_blocks(audio_path, start, rate):
+        if first is None:
+            first = block_start
+        parts.append(samples)
+        if block_start + samples.size / float(rate) >= end:
+            break
+    if not parts:
+        return np.zeros(0, dtype=np.float32)
+    pcm = np.concatenate(parts)
+    lo = max(0, int(round((start - first) * rate)))
+    hi = max(lo, int(round((end - first) * rate)))
+    return pcm[lo:hi].astype(np.float32) / 32768.0
+
+
+def write_pcm(
+    out_path: str,
+    samples: np.ndarray,
+    rate: int = SAMPLE_RATE,
+    codec: str = "mp3",
+    bit_rate: int = 48000,
+) -> str:
+    """
+    Encode mono float32 samples into an audio file.
+    """
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+    container = av.open(out_path, mode="w")
+    try:
+        stream = container.add_stream(codec, rate=rate)
+        stream.layout = "mono"
+        stream.bit_rate = bit_rate
+        frame = av.AudioFrame.from_ndarray(
+            pcm.reshape(1, -1), format="s16", layout="mono"
+        )
+        frame.sample_rate = rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    finally:
+        container.close()
+    return out_path
+
+
+def window_energies(
+    audio_path: str, window: float = 0.1, rate: int = SAMPLE_RATE
+) -> np.ndarray:
+    """
+    RMS level in dBFS for consecutive ``window``-second slices of the audio.
+    """
+    size = max(1, int(window * rate))
+    carry = np.zeros(0, dtype=np.int16)
+    levels: List[np.ndarray] = []
+    for _, samples in iter_pcm_blocks(audio_path, 0.0, rate):
+        buf = np.concatenate([carry, samples]) if carry.size else samples
+        usable = (buf.size // size) * size
+        if usable:
+            levels.append(_rms_db(buf[:usable].reshape(-1, size)))
+        carry = buf[usable:]
+    if carry.size:
+        levels.append(_rms_db(carry.reshape(1, -1)))
+    if not levels:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(levels)
+
+
+def _rms_db(frames: np.ndarray) -> np.ndarray:
+    x = frames.astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(x * x, axis=1))
+    return (20.0 * np.log10(np.maximum(rms, 1e-6))).astype(np.float32)
+
+
+def plan_chunks(
+    duration: float,
+    chunk_seconds: float,
+    overlap_seconds: float = 0.0,
+    energies: Optional[np.ndarray] = None,
+    window: float = 0.1,
+    search_seconds: float = 30.0,
+) -> List[AudioChunk]:
+    """
+    Split ``[0, duration)`` into chunks of about ``chunk_seconds``.
+
+    When per-window ``energies`` are given, every cut is moved to the quietest
+    window within ``search_seconds`` of the nominal boundary so that words are
+    not split between requests.
+    """
+    if duration <= 0:
+        return []
+    search = min(search_seconds, chunk_seconds / 4.0)
+    cuts = [0.0]
+    while duration - cuts[-1] > chunk_seconds:
+        target = cuts[-1] + chunk_seconds
+        cut = target
+        if energies is not None and len(energies):
+            lo = int((target - search) / window)
+            hi = min(int((target + search) / window) + 1, len(energies))
+            if hi > lo:
+                cut = (lo + int(np.argmin(energies[lo:hi])) + 0.5) * window
+        if cut <= cuts[-1] or cut >= duration:
+            cut = target
+        cuts.append(min(cut, duration))
+    cuts.append(duration)
+    chunks = []
+    for idx in range(len(cuts) - 1):
+        keep_start, keep_end = cuts[idx], cuts[idx + 1]
+        chunks.append(
+            AudioChunk(
+                index=idx,
+                start=max(0.0, keep_start - overlap_seconds),
+                end=min(duration, keep_end + overlap_seconds),
+                keep_start=keep_start,
+                keep_end=keep_end,
+            )
+        )
+    return chunks
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r"\W+", " ", (text or "").lower()).strip()
+
+
+def stitch_segments(
+    results: Sequence[Tuple[AudioChunk, Sequence[dict]]]
+) -> List[dict]:
+    """
+    Merge per-chunk segments (relative to their chunk) into one timeline.
+
+    Each chunk keeps the segments whose midpoint falls into its ``keep``
+    range, which drops the duplicates produced by overlapping windows; an
+    identical segment repeated across a cut is removed as well.
+    """
+    merged: List[dict] = []
+    for chunk, segments in sorted(results, key=lambda r: r[0].index):
+        for seg in segments or []:
+            try:
+                start = float(seg.get("start", 0.0)) + chunk.start
+                end = float(seg.get("end", 0.0)) + chunk.start
+            except Exception:
+                continue
+            text = (seg.get("text") or "").strip()
+            if not text:
+                continue
+            end = max(end, start)
+            mid = (start + end) / 2.0
+            is_last = chunk.keep_end >= chunk.end
+            if mid < chunk.keep_start or (mid >= chunk.keep_end and not is_last):
+                continue
+            if merged:
+                prev = merged[-1]
+                if start < prev["end"] and _normalize_text(text) == _normalize_text(prev["text"]):
+                    continue
+                start = max(start, prev["start"])
+            merged.append({"start": start, "end": end, "text": text})
+    return merged
+
+
+class TimeMap:
+    """
+    Piecewise mapping from a silence-compressed timeline back to the
+    original one. ``spans`` holds ``(compressed_start, original_start)``
+    pairs for every contiguous kept region, sorted by compressed time.
+    """
+
+    def __init__(self, spans: Optional[Sequence[Sequence[float]]] = None):
+        self.spans: List[Tuple[float, float]] = [
+            (float(a), float(b)) for a, b in (spans or [(0.0, 0.0)])
+        ]
+        self._starts = [a for a, _ in self.spans]
+
+    @property
+    def is_identity(self) -> bool:
+        return all(abs(a - b) < 1e-9 for a, b in self.spans)
+
+    def add_span(self, compressed_start: float, original_start: float):
+        if self.spans and abs(self.spans[-1][0] - compressed_start) < 1e-9:
+            self.spans[-1] = (compressed_start, original_start)
+            self._starts[-1] = compressed_start
+            return
+        self.spans.append((compressed_start, original_start))
+        self._starts.append(compressed_start)
+
+    def to_original(self, t: float, at_end: bool = False) -> float:
+        """
+        Map compressed time ``t`` to original time. With ``at_end`` a value
+        lying exactly on a span boundary is attributed to the earlier span,
+        so segment ends do not jump over the removed silence.
+        """
+        idx = (bisect_left if at_end else bisect_right)(self._starts, t) - 1
+        idx = max(0, idx)
+        start, orig = self.spans[idx]
+        return orig + (t - start)
+
+    def remap_segments(self, segments: Sequence[dict]) -> List[dict]:
+        if self.is_identity:
+            return list(segments or [])
+        remapped = []
+        for seg in segments or []:
+            item = dict(seg)
+            start = float(seg.get("start", 0.0))
+            end = float(seg.get("end", start))
+            item["start"] = self.to_original(start)
+            item["end"] = max(item["start"], self.to_original(end, at_end=True))
+            remapped.append(item)
+        return remapped
+
+    def to_json(self) -> dict:
+        return {"spans": [list(span) for span in self.spans]}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "TimeMap":
+        return cls((data or {}).get("spans") or None)
+
+
+def time_map_path_for(audio_path: str) -> str:
+    return f"{audio_path}.timemap.json"
+
+
+def load_time_map(audio_path: str) -> TimeMap:
+    """
+    Return the time map stored next to ``audio_path`` (identity if none).
+    """
+    path = time_map_path_for(audio_path)
+    if not os.path.isfile(path):
+        return TimeMap()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return TimeMap.from_json(json.load(f))
+    except Exception:
+        return TimeMap()
+
+
+def save_time_map(audio_path: str, time_map: TimeMap):
+    path = time_map_path_for(audio_path)
+    if time_map.is_identity:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(time_map.to_json(), f)
+
+
+class SilenceCompressor:
+    """
+    Streaming energy-based voice activity detector.
+
+    Mono int16 samples are classified in ``frame_ms`` frames by RMS level;
+    pauses longer than ``min_silence`` seconds are shortened to
+    ``keep_silence`` seconds (half kept on each side). Every removed stretch
+    is recorded in ``time_map`` so timestamps measured on the compressed
+    audio can be mapped back. A pause is buffered only until it is known
+    to be long; after that just its first and last ``keep_half`` samples
+    are kept, so memory stays bounded on silent tracks.
+    """
+
+    def __init__(
+        self,
+        rate: int = SAMPLE_RATE,
+        frame_ms: float = 30.0,
+        threshold_db: float = -45.0,
+        min_silence: float = 2.0,
+        keep_silence: float = 0.5,
+    ):
+        self.rate = rate
+        self.frame = max(1, int(rate * frame_ms / 1000.0))
+        self.threshold_db = threshold_db
+        self.min_silence = max(int(min_silence * rate), 1)
+        self.keep_half = min(int(keep_silence * rate / 2), self.min_silence // 2)
+        self.time_map = TimeMap()
+        self.removed_seconds = 0.0
+        self._carry = np.zeros(0, dtype=np.int16)
+        self._silence: List[np.ndarray] = []
+        self._silence_len = 0
+        # Set once the current pause exceeds ``min_silence``.
+        self._head: Optional[np.ndarray] = None
+        self._tail: Optional[np.ndarray] = None
+        self._consumed = 0  # original samples classified so far
+        self._emitted = 0  # samples written to the compressed output
+
+    def _add_silence(self, run: np.ndarray):
+        self._silence_len += run.size
+        if self._head is None:
+            self._silence.append(run)
+            if self._silence_len <= self.min_silence:
+                return
+            pending = np.concatenate(self._silence)
+            self._silence = []
+            self._head = pending[: self.keep_half]
+            self._tail = pending[pending.size - self.keep_half:]
+            return
+        if self.keep_half:
+            tail = np.concatenate([self._tail, run[max(0, run.size - self.keep_half):]])
+            self._tail = tail[tail.size - self.keep_half:]
+
+    def _flush_silence(self, closing: bool = False) -> List[np.ndarray]:
+        length = self._silence_len
+        head, tail = self._head, self._tail
+        pending = np.concatenate(self._silence) if self._silence else None
+        self._silence, self._silence_len = [], 0
+        self._head = self._tail = None
+        if head is None:
+            if pending is None:
+                return []
+            self._emitted += length
+            return [pending]
+        if closing:
+            tail = tail[:0]
+        silence_start = self._consumed - length
+        self._emitted += head.size
+        resume_original = silence_start + length - tail.size
+        if not closing:
+            self.time_map.add_span(
+                self._emitted / float(self.rate), resume_original / float(self.rate)
+            )
+        self._emitted += tail.size
+        self.removed_seconds += (length - head.size - tail.size) / float(self.rate)
+        return [head, tail]
+
+    def feed(self, samples: np.ndarray) -> np.ndarray:
+        buf = np.concatenate([self._carry, samples]) if self._carry.size else samples
+        usable = (buf.size // self.frame) * self.frame
+        self._carry = buf[usable:]
+        if not usable:
+            return np.zeros(0, dtype=np.int16)
+        frames = buf[:usable].reshape(-1, self.frame)
+        speech = _rms_db(frames) > self.threshold_db
+        out: List[np.ndarray] = []
+        # Walk runs of equal classification instead of individual frames.
+        edges = np.flatnonzero(np.diff(speech.astype(np.int8))) + 1
+        bounds = [0, *edges.tolist(), len(speech)]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            run = frames[lo:hi].reshape(-1)
+            if speech[lo]:
+                out.extend(self._flush_silence())
+                self._consumed += run.size
+                self._emitted += run.size
+                out.append(run)
+            else:
+                self._consumed += run.size
+                self._add_silence(run)
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.int16)
+
+    def flush(self) -> np.ndarray:
+        out = []
+        if self._carry.size:
+            self._add_silence(self._carry)
+            self._consumed += self._carry.size
+            self._carry = np.zeros(0, dtype=np.int16)
+        out.extend(self._flush_silence(closing=True))
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.int16)
+
+
+def _mono_frame(samples: np.ndarray, rate: int = SAMPLE_RATE):
+    frame = av.AudioFrame.from_ndarray(
+        samples.reshape(1, -1), format="s16", layout="mono"
+    )
+    frame.sample_rate = rate
+    return frame
+
+
+class _EncodedSink:
+    def __init__(self, path: str, codec: str, rate: int = SAMPLE_RATE):
+        self.rate = rate
+        self.container = av.open(path, mode="w")
+        self.stream = self.container.add_stream(
+            _ENCODERS[codec], rate=rate, options=dict(_ENCODER_OPTIONS.get(codec, {}))
+        )
+        self.stream.layout = "mono"
+        self.stream.bit_rate = _BIT_RATES[codec]
+
+    def write(self, samples: np.ndarray):
+        for packet in self.stream.encode(_mono_frame(samples, self.rate)):
+            self.container.mux(packet)
+
+    def close(self):
+        try:
+            for packet in self.stream.encode(None):
+                self.container.mux(packet)
+        finally:
+            self.container.close()
+
+
+def _remux_audio(in_container, audio_stream, out_path: str) -> str:
+    out_container = av.open(out_path, mode="w")
+    try:
+        if hasattr(out_container, "add_stream_from_template"):
+            out_stream = out_container.add_stream_from_template(audio_stream)
+        else:
+            out_stream = out_container.add_stream(template=audio_stream)
+        for packet in in_container.demux(audio_stream):
+            if packet.dts is None:
+                continue
+            packet.stream = out_stream
+            out_container.mux(packet)
+    finally:
+        out_container.close()
+    return out_path
+
+
+def _partial_path(path: str) -> str:
+    # Keep the extension last: PyAV picks the container format from it.
+    root, ext = os.path.splitext(path)
+    return f"{root}.{uuid.uuid4().hex}.part{ext}"
+
+
+def extract_audio(
+    video_path: str,
+    out_dir: str,
+    base_dir: str,
+    fmt: str = "mp3",
+    silence: Optional[SilenceCompressor] = None,
+    stream_copy: bool = False,
+    batch_seconds: float = 1.0,
+) -> str:
+    """
+    Extract the audio track of ``video_path`` into ``out_dir``.
+
+    ``fmt`` is an output codec (``mp3``, ``aac``, ``opus``) or ``wav`` for
+    16-bit PCM that local whisper memory-maps. Decoding uses the codec's
+    own threads and resampled samples are handed to the VAD and encoder in
+    ``batch_seconds`` blocks. With ``stream_copy`` and no ``silence``
+    compressor, a source track already in an STT-accepted codec is remuxed
+    without decoding, keeping its original rate and channels; the returned
+    path then carries that codec's extension.
+
+    The audio is written to a temporary file and moved into place after its
+    time map, so an interrupted extraction never leaves a truncated file
+    that looks finished.
+    """
+    base = os.path.splitext(os.path.basename(video_path))[0]
+    codec = "pcm" if fmt == "wav" else fmt
+    if codec not in AUDIO_CODEC_EXTENSIONS:
+        raise ValueError(f"Unsupported audio codec: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_path = None
+    in_container = av.open(video_path)
+    try:
+        audio_stream = _open_audio_stream(in_container)
+        source_codec = audio_stream.codec_context.name
+        if stream_copy and silence is None and codec != "pcm" and source_codec in STREAM_COPY_EXTENSIONS:
+            out_path = os.path.join(out_dir, f"{base}.{STREAM_COPY_EXTENSIONS[source_codec]}")
+            tmp_path = _partial_path(out_path)
+            _remux_audio(in_container, audio_stream, tmp_path)
+            save_time_map(out_path, TimeMap())
+            os.replace(tmp_path, out_path)
+            return out_path
+
+        out_path = os.path.join(out_dir, f"{base}.{AUDIO_CODEC_EXTENSIONS[codec]}")
+        tmp_path = _partial_path(out_path)
+        audio_stream.codec_context.thread_type = "AUTO"
+        audio_stream.codec_context.thread_count = 0
+        sink = PcmWavWriter(tmp_path) if codec == "pcm" else _EncodedSink(tmp_path, codec)
+        try:
+            resampler = AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+            batch_size = max(1, int(batch_seconds * SAMPLE_RATE))
+            pending: List[np.ndarray] = []
+            pending_size = 0
+
+            def _drain():
+                nonlocal pending, pending_size
+                if not pending:
+                    return
+                samples = pending[0] if len(pending) == 1 else np.concatenate(pending)
+                pending, pending_size = [], 0
+                if silence is not None:
+                    samples = silence.feed(samples)
+                if samples.size:
+                    sink.write(samples)
+
+            def _collect(frames):
+                nonlocal pending_size
+                for rf in frames or []:
+                    samples = rf.to_ndarray().reshape(-1)
+                    pending.append(samples)
+                    pending_size += samples.size
+                if pending_size >= batch_size:
+                    _drain()
+
+            for frame in in_container.decode(audio_stream):
+                _collect(resampler.resample(frame))
+            _collect(resampler.resample(None))
+            _drain()
+            if silence is not None:
+                tail = silence.flush()
+                if tail.size:
+                    sink.write(tail)
+        finally:
+            sink.close()
+        save_time_map(out_path, silence.time_map if silence is not None else TimeMap())
+        os.replace(tmp_path, out_path)
+        return out_path
+    except BaseException:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        in_container.close()
@@ -0,0 +1,234 @@
+"""
+Response compression.
+
+Dynamic text responses (JSON, HTML, JS, CSS) are compressed per request
+with brotli when the optional ``brotli`` package is installed and the
+client accepts it, otherwise gzip. Stored subtitles and suggestions get
+precompressed sidecars (``<file>.gz`` / ``<file>.br``) when they are
+written, and ``send_json_file`` serves those bytes as they are, so the
+largest responses cost no compression CPU per request.
+"""
+
+from __future__ import annotations
+
+import gzip
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from flask import Response, request
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+GZIP_LEVEL = 6
+# Per-request brotli favours speed; sidecars are written once per file and
+# can afford a denser setting.
+BROTLI_QUALITY = 5
+BROTLI_SIDECAR_QUALITY = 9
+
+SIDECAR_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+COMPRESSIBLE_TYPES = frozenset(
+    {
+        "application/json",
+        "application/javascript",
+        "text/javascript",
+        "text/css",
+        "text/html",
+        "text/plain",
+        "image/svg+xml",
+    }
+)
+
+logger = logging.getLogger("llmath_video.compression")
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding() -> Optional[str]:
+    """
+    Best encoding the client accepts (``Accept-Encoding`` q-values are
+    honoured), or None for identity.
+    """
+    best = request.accept_encodings.best_match(available_encodings())
+    return best or None
+
+
+def compress(data: bytes, encoding: str, sidecar: bool = False) -> bytes:
+    if encoding == "br":
+        quality = BROTLI_SIDECAR_QUALITY if sidecar else BROTLI_QUALITY
+        return brotli.compress(data, quality=quality)
+    level = 9 if sidecar else GZIP_LEVEL
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def sidecar_path(path: str, encoding: str) -> str:
+    return path + SIDECAR_SUFFIXES[encoding]
+
+
+def sidecar_paths(path: str):
+    return [path + suffix for suffix in SIDECAR_SUFFIXES.values()]
+
+
+def _signature(st: os.stat_result):
+    return st.st_size, st.st_mtime_ns
+
+
+def write_sidecars(path: str):
+    """
+    Write precompressed copies of ``path`` for every available encoding.
+    Failures are logged; the plain file stays authoritative.
+
+    Each sidecar gets the source's mtime, which ``_fresh_sidecar`` compares
+    for equality. If the source is rewritten while it is being compressed,
+    the outdated sidecar is not installed.
+    """
+    try:
+        with open(path, "rb") as f:
+            source = _signature(os.fstat(f.fileno()))
+            data = f.read()
+        for encoding in available_encodings():
+            target = sidecar_path(path, encoding)
+            tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(compress(data, encoding, sidecar=True))
+                os.utime(tmp_path, ns=(source[1], source[1]))
+                if _signature(os.stat(path)) != source:
+                    return
+                os.replace(tmp_path, target)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+    except OSError:
+        logger.exception("sidecar write failed: path=%s", path)
+
+
+def _fresh_sidecar(path: str, encoding: str) -> Optional[str]:
+    """
+    Sidecar for ``encoding`` if it was built from the current ``path``; a
+    missing or stale one is (re)written first, so files produced before
+    sidecars existed are compressed once on first request.
+    """
+    target = sidecar_path(path, encoding)
+    try:
+        source_mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    try:
+        if os.stat(target).st_mtime_ns == source_mtime:
+            return target
+    except OSError:
+        pass
+    write_sidecars(path)
+    try:
+        if os.stat(target).st_mtime_ns == source_mtime:
+            return target
+    except OSError:
+        pass
+    return None
+
+
+def send_json_file(path: str) -> Response:
+    """
+    Serve a stored JSON document byte for byte, from its precompressed
+    sidecar when the client accepts the encoding.
+    """
+    encoding = negotiate_encoding()
+    target = _fresh_sidecar(path, encoding) if encoding else None
+    with open(target or path, "rb") as f:
+        data = f.read()
+    response = Response(data, mimetype="application/json")
+    if target:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+class _StaticCache:
+    """
+    Compressed static files keyed by (path, ETag, encoding), so each asset
+    version is compressed once per process.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: tuple, data: bytes):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def register_compression(app, config: Dict):
+    """
+    Compress eligible responses after each request. Streaming responses
+    (server-sent events), partial content and anything already encoded
+    are left alone.
+    """
+    if not config.get("compression_enabled", True):
+        return
+    min_bytes = int(config.get("compression_min_bytes", 512) or 0)
+    max_static_bytes = 4 * 1024 * 1024
+    static_cache = _StaticCache()
+
+    @app.after_request
+    def _compress_response(response: Response):
+        if (
+            response.status_code != 200
+            or response.mimetype not in COMPRESSIBLE_TYPES
+            or "Content-Encoding" in response.headers
+            or "Content-Range" in response.headers
+            or (response.is_streamed and not response.direct_passthrough)
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate_encoding()
+        if encoding is None:
+            return response
+        etag, _ = response.get_etag()
+        if response.direct_passthrough:
+            # Static files: read once, then serve the compressed copy.
+            length = response.content_length
+            if length is None or length > max_static_bytes or length < min_bytes:
+                return response
+            key = (request.path, etag, encoding)
+            data = static_cache.get(key) if etag else None
+            if data is None:
+                response.direct_passthrough = False
+                data = compress(response.get_data(), encoding)
+                if etag:
+                    static_cache.put(key, data)
+            elif hasattr(response.response, "close"):
+                response.response.close()
+        else:
+            body = response.get_data()
+            if len(body) < min_bytes:
+                return response
+            data = compress(body, encoding)
+        response.direct_passthrough = False
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        if etag:
+            # The encoded body differs byte-wise from the identity one.
+            response.set_etag(etag, weak=True)
+        return response
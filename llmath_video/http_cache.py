@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Callable, Optional, Sequence, Tuple
+
+from flask import Response, make_response, request
+
+
+def file_validators(
+    paths: Sequence[str], variant: str = ""
+) -> Optional[Tuple[str, datetime]]:
+    """
+    ETag and Last-Modified for a response built from ``paths``.
+
+    The ETag hashes the size and mtime of every file plus ``variant`` (the
+    query parameters that select part of the data), so each representation
+    gets its own tag. Returns None when none of the files exist.
+    """
+    parts = [variant]
+    newest = None
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            parts.append("-")
+            continue
+        parts.append(f"{st.st_size}:{st.st_mtime_ns}")
+        newest = max(newest or 0.0, st.st_mtime)
+    if newest is None:
+        return None
+    etag = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:24]
+    last_modified = datetime.fromtimestamp(int(newest), tz=timezone.utc)
+    return etag, last_modified
+
+
+def _not_modified(etag: str, last_modified: datetime) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified <= since
+
+
+def conditional(
+    paths: Sequence[str], build: Callable[[], object], variant: str = ""
+) -> Response:
+    """
+    Answer a GET for data stored in ``paths`` with validators.
+
+    When the client's ``If-None-Match`` / ``If-Modified-Since`` still
+    matches, a bodiless 304 is returned without calling ``build`` (so the
+    files are not read). ``Cache-Control: no-cache`` makes browsers
+    revalidate on every request instead of reusing a stale copy.
+
+    The ETag is always weak: it is derived from file metadata, and the same
+    data may be sent gzip- or brotli-encoded. Validators are taken again
+    after ``build`` for files it creates on demand; if the files changed
+    while the response was built, none are sent.
+    """
+    before = file_validators(paths, variant)
+    if before is not None and _not_modified(*before):
+        response = Response(status=304)
+        validators = before
+    else:
+        response = make_response(build())
+        after = file_validators(paths, variant)
+        validators = after if before is None or after == before else None
+    if validators is not None and response.status_code in (200, 304):
+        etag, last_modified = validators
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    name TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stage TEXT NOT NULL DEFAULT '',
+    priority INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_claim_order
+    ON jobs (status, priority, enqueued_at);
+"""
+
+
+class JobStore:
+    """
+    Durable processing queue backed by a SQLite file.
+
+    Every process (gunicorn workers, standalone workers) opens the same file;
+    claims take a write lock so a job is leased to exactly one owner. A job
+    whose lease expires (its owner crashed or was restarted) becomes
+    claimable again and resumes from the first stage without an artifact.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max(1, int(max_attempts))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def enqueue(self, name: str, priority: int) -> bool:
+        """
+        Add a job or raise the priority of a queued one.
+        Returns False when the job is already queued or leased.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT status, priority, lease_expires FROM jobs WHERE name = ?",
+                (name,),
+            ).fetchone()
+            if row is not None and row["status"] == JOB_QUEUED:
+                if priority < row["priority"]:
+                    conn.execute(
+                        "UPDATE jobs SET priority = ?, updated_at = ? WHERE name = ?",
+                        (priority, now, name),
+                    )
+                return False
+            if (
+                row is not None
+                and row["status"] == JOB_RUNNING
+                and (row["lease_expires"] or 0) > now
+            ):
+                return False
+            conn.execute(
+                """
+                INSERT INTO jobs (name, status, stage, priority, attempts,
+                                  lease_owner, lease_expires, enqueued_at,
+                                  updated_at, error)
+                VALUES (?, ?, '', ?, 0, NULL, NULL, ?, ?, NULL)
+                ON CONFLICT(name) DO UPDATE SET
+                    status = excluded.status,
+                    -- Keep the stage of an interrupted run so it is reported
+                    -- as resumed; a finished or failed job starts afresh.
+                    stage = CASE WHEN jobs.status = ? THEN jobs.stage ELSE '' END,
+                    priority = excluded.priority,
+                    attempts = 0,
+                    lease_owner = NULL,
+                    lease_expires = NULL,
+                    enqueued_at = excluded.enqueued_at,
+                    updated_at = excluded.updated_at,
+                    error = NULL
+                """,
+                (name, JOB_QUEUED, priority, now, now, JOB_RUNNING),
+            )
+            return True
+
+    def claim(self, owner: str, lease_seconds: float) -> Optional[Dict]:
+        """
+        Lease the next queued (or abandoned) job to ``owner``.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL,
+                                error = 'lease expired too many times', updated_at = ?
+                WHERE status = ? AND lease_expires < ? AND attempts >= ?
+                """,
+                (JOB_FAILED, now, JOB_RUNNING, now, self.max_attempts),
+            )
+            row = conn.execute(
+                """
+                SELECT * FROM jobs
+                WHERE status = ? OR (status = ? AND lease_expires < ?)
+                ORDER BY priority, enqueued_at
+                LIMIT 1
+                """,
+                (JOB_QUEUED, JOB_RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?,
+                                attempts = attempts + 1, updated_at = ?
+                WHERE name = ?
+                """,
+                (JOB_RUNNING, owner, now + lease_seconds, now, row["name"]),
+            )
+            job = dict(row)
+            job["attempts"] += 1
+            return job
+
+    def renew(self, owner: str, lease_seconds: float) -> int:
+        """
+        Extend the leases of every job currently held by ``owner``.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                """
+                UPDATE jobs SET lease_expires = ?, updated_at = ?
+                WHERE status = ? AND lease_owner = ?
+                """,
+                (now + lease_seconds, now, JOB_RUNNING, owner),
+            )
+            return cur.rowcount
+
+    def set_stage(self, name: str, owner: str, stage: str):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE jobs SET stage = ?, updated_at = ?
+                WHERE name = ? AND lease_owner = ?
+                """,
+                (stage, time.time(), name, owner),
+            )
+
+    def finish(self, name: str, owner: str, error: Optional[str] = None):
+        status = JOB_FAILED if error else JOB_DONE
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL,
+                                error = ?, updated_at = ?
+                WHERE name = ? AND lease_owner = ?
+                """,
+                (status, error, time.time(), name, owner),
+            )
+
+    def get(self, name: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list_active(self) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT * FROM jobs WHERE status IN (?, ?)
+                ORDER BY status DESC, priority, enqueued_at
+                """,
+                (JOB_QUEUED, JOB_RUNNING),
+            ).fetchall()
+        return [dict(r) for r in rows]
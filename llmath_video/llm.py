@@ -1,22 +1,45 @@
 from __future__ import annotations
 
+import difflib
 import json
+import math
 import os
 import re
 import shutil
 import subprocess
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Callable, Dict, List, Sequence
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
 from openai import OpenAI
 import av
 
 from config_manager import get_llm_setting, get_prompt_template
 
-try:
-    import whisper
-except Exception:
-    whisper = None
+from .audio import (
+    SAMPLE_RATE,
+    load_time_map,
+    plan_chunks,
+    read_pcm,
+    stitch_segments,
+    window_energies,
+    write_pcm,
+)
+from .llm_cache import cache_key, response_cache
+from .openai_clients import openai_clients
+from .rate_limit import (
+    PRIORITY_BACKGROUND,
+    estimate_tokens,
+    is_retryable,
+    llm_limiter,
+    retry_after_seconds,
+)
+from .whisper_models import (
+    get_transcription_pool,
+    run_whisper,
+    transcription_parallelism,
+)
 
 
 def get_openai_client(
@@ -28,31 +51,134 @@ def get_openai_client(
     api_key = (llm_config.get(key_name) or llm_config.get("openai_api_key") or "").strip()
     if not api_key:
         raise RuntimeError(f"{key_name} is not configured")
-    return OpenAI(
-        api_key=api_key,
-        base_url=base_url,
-    )
+    return openai_clients.get(llm_config, base_url, api_key)
 
 
-def call_openai_text(client, model: str, input_text: str) -> str:
-    last_err = None
-    for attempt in range(3):
+def _wait_before_retry(error: Exception, attempt: int, attempts: int):
+    """
+    Re-raise ``error`` when it is final, otherwise wait as the provider or
+    the backoff policy asks before the next attempt.
+    """
+    if attempt + 1 >= attempts or not is_retryable(error):
+        raise error
+    delay = retry_after_seconds(error)
+    if delay is None:
+        delay = llm_limiter.backoff(attempt)
+    if getattr(error, "status_code", None) == 429:
+        # The quota is shared: hold every caller, not just this one.
+        llm_limiter.penalize(delay)
+    else:
+        time.sleep(delay)
+
+
+def chat_completion(
+    client,
+    model: str,
+    messages: List[dict],
+    use_cache: bool = True,
+    priority: int = PRIORITY_BACKGROUND,
+) -> str:
+    """
+    Run a chat completion and return the stripped answer text.
+
+    Identical requests are served from the response cache unless
+    ``use_cache`` is False (a fresh answer is still stored for later
+    callers). Requests pass the shared rate limiter in ``priority`` order;
+    429s honour ``Retry-After`` for every caller, other transient failures
+    back off with jitter.
+    """
+    endpoint = f"{getattr(client, 'base_url', '')}chat/completions"
+    key = cache_key(endpoint, model, messages)
+    if use_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+    estimated = estimate_tokens(messages)
+    attempts = llm_limiter.max_retries + 1
+    for attempt in range(attempts):
+        llm_limiter.acquire(estimated, priority)
         try:
-            chat = client.chat.completions.create(
+            chat = client.chat.completions.create(model=model, messages=messages)
+        except Exception as e:
+            _wait_before_retry(e, attempt, attempts)
+            continue
+        usage = getattr(chat, "usage", None)
+        llm_limiter.settle(estimated, getattr(usage, "total_tokens", None))
+        answer = (chat.choices[0].message.content or "").strip()
+        response_cache.put(key, answer, endpoint, model)
+        return answer
+    return ""
+
+
+def stream_chat_completion(
+    client,
+    model: str,
+    messages: List[dict],
+    use_cache: bool = True,
+    priority: int = PRIORITY_BACKGROUND,
+) -> Iterator[str]:
+    """
+    Streaming counterpart of ``chat_completion``: yields answer text deltas
+    as the provider produces them. A cached answer is yielded in one piece;
+    the complete answer is cached once the stream ends. Failures before the
+    first delta are retried like ``chat_completion``; later ones propagate.
+    """
+    endpoint = f"{getattr(client, 'base_url', '')}chat/completions"
+    key = cache_key(endpoint, model, messages)
+    if use_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+    estimated = estimate_tokens(messages)
+    attempts = llm_limiter.max_retries + 1
+    for attempt in range(attempts):
+        llm_limiter.acquire(estimated, priority)
+        try:
+            stream = client.chat.completions.create(
                 model=model,
-                messages=[{"role": "user", "content": input_text}],
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
             )
-            return (chat.choices[0].message.content or "").strip()
         except Exception as e:
-            last_err = e
-            msg = str(e)
-            if "429" in msg or "rate" in msg.lower():
-                time.sleep(1.5 * (attempt + 1))
-                continue
-            break
-    if last_err:
-        raise last_err
-    return ""
+            _wait_before_retry(e, attempt, attempts)
+            continue
+        parts: List[str] = []
+        total_tokens = None
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    total_tokens = getattr(usage, "total_tokens", None)
+                for choice in getattr(chunk, "choices", None) or []:
+                    delta = getattr(choice.delta, "content", None)
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        llm_limiter.settle(estimated, total_tokens)
+        response_cache.put(key, "".join(parts).strip(), endpoint, model)
+        return
+
+
+def call_openai_text(
+    client,
+    model: str,
+    input_text: str,
+    use_cache: bool = True,
+    priority: int = PRIORITY_BACKGROUND,
+) -> str:
+    return chat_completion(
+        client,
+        model,
+        [{"role": "user", "content": input_text}],
+        use_cache=use_cache,
+        priority=priority,
+    )
 
 
 def _probe_duration(audio_path: str, base_dir: str) -> float:
@@ -68,7 +194,9 @@ def _probe_duration(audio_path: str, base_dir: str) -> float:
         container.close()
 
 
-def _fallback_segments(full_text: str, base_dir: str, audio_path: str) -> list:
+def _fallback_segments(
+    full_text: str, base_dir: str, audio_path, duration: float | None = None
+) -> list:
     full_text = (full_text or "").strip()
     if not full_text:
         return []
@@ -79,7 +207,7 @@ def _fallback_segments(full_text: str, base_dir: str, audio_path: str) -> list:
     ]
     if not sentences:
         sentences = [full_text]
-    dur = _probe_duration(audio_path, base_dir) or 0.0
+    dur = duration if duration is not None else (_probe_duration(audio_path, base_dir) or 0.0)
     n = len(sentences)
     segs = []
     if dur <= 0.0:
@@ -97,103 +225,300 @@ def _fallback_segments(full_text: str, base_dir: str, audio_path: str) -> list:
     return segs
 
 
+def _create_transcription(client, audio_file, **params):
+    """
+    Speech-to-text request through the shared rate limiter, retried and
+    backed off like ``chat_completion`` (the client itself never retries).
+    """
+    attempts = llm_limiter.max_retries + 1
+    for attempt in range(attempts):
+        llm_limiter.acquire(0, PRIORITY_BACKGROUND)
+        try:
+            audio_file.seek(0)
+            return client.audio.transcriptions.create(file=audio_file, **params)
+        except Exception as e:
+            _wait_before_retry(e, attempt, attempts)
+
+
 def transcribe_with_openai(audio_path: str, llm_config: Dict, base_dir: str):
-    api_key = llm_config.get("openai_api_key")
+    """
+    Transcribe via the OpenAI-compatible speech-to-text API.
+    Returns [] only when the provider heard no speech; a request that still
+    fails after retries raises, so the transcribe stage is retried.
+    """
     client = get_openai_client(
         llm_config, base_key="openai_stt_api_base", key_name="openai_stt_api_key"
     )
     stt_model = get_llm_setting(llm_config, "openai_stt_model")
     language = get_llm_setting(llm_config, "whisper_language")
 
-    try:
-        with open(audio_path, "rb") as f:
+    with open(audio_path, "rb") as f:
+        try:
+            resp = _create_transcription(
+                client,
+                f,
+                model=stt_model,
+                response_format="verbose_json",
+                language=language,
+                timestamp_granularities=["segment"],
+            )
+        except Exception as e:
+            # Transient failures were already retried and are final; other
+            # errors usually mean verbose_json is unsupported, so fall back
+            # to a plain request below.
+            if is_retryable(e):
+                raise
+            resp = None
+        raw_segments = getattr(resp, "segments", None)
+        if raw_segments is None and resp is not None:
             try:
-                resp = client.audio.transcriptions.create(
-                    model=stt_model,
-                    file=f,
-                    response_format="verbose_json",
-                    language=language,
-                    timestamp_granularities=["segment"],
-                )
-                raw_segments = getattr(resp, "segments", None)
-                if raw_segments is None:
-                    try:
-                        raw_segments = resp.get("segments")
-                    except Exception:
-                        raw_segments = None
-                segments = []
-                for seg in (raw_segments or []):
-                    try:
-                        start = float(seg.get("start"))
-                        end = float(seg.get("end"))
-                        text = (seg.get("text") or "").strip()
-                    except Exception:
-                        start = float(getattr(seg, "start", 0.0))
-                        end = float(getattr(seg, "end", 0.0))
-                        text = (getattr(seg, "text", "") or "").strip()
-                    if text:
-                        segments.append({"start": start, "end": end, "text": text})
-                if segments:
-                    return segments
-                full_text = (getattr(resp, "text", "") or "").strip()
-                if not full_text:
-                    try:
-                        full_text = (resp.get("text") or "").strip()
-                    except Exception:
-                        full_text = ""
+                raw_segments = resp.get("segments")
             except Exception:
-                full_text = ""
-
-            if not full_text:
-                f.seek(0)
-                resp2 = client.audio.transcriptions.create(model=stt_model, file=f)
-                full_text = (getattr(resp2, "text", "") or "").strip()
-            if not full_text:
-                return []
-            return _fallback_segments(full_text, base_dir, audio_path)
-    except Exception:
-        return []
-
-
-def transcribe_with_whisper_local(audio_path: str, llm_config: Dict, base_dir: str):
-    """
-    Local transcription using openai-whisper python package.
-    Returns list of {start, end, text} segment dicts or [] on failure.
-    """
-    try:
-        model_name = get_llm_setting(llm_config, "whisper_local_model") or "base"
-        language = (get_llm_setting(llm_config, "whisper_language") or "").strip() or None
-        model = whisper.load_model(model_name)
-        result = model.transcribe(audio_path, language=language)
-        segments: List[dict] = []
-        for seg in (result.get("segments") or []):
-            text = (seg.get("text") or "").strip()
-            if not text:
-                continue
+                raw_segments = None
+        segments = []
+        for seg in (raw_segments or []):
             try:
-                start = float(seg.get("start", 0.0))
-                end = float(seg.get("end", 0.0))
+                start = float(seg.get("start"))
+                end = float(seg.get("end"))
+                text = (seg.get("text") or "").strip()
             except Exception:
-                start = float(seg.get("start") or 0.0) if hasattr(seg, "get") else 0.0
-                end = float(seg.get("end") or 0.0) if hasattr(seg, "get") else 0.0
-            segments.append({"start": start, "end": end, "text": text})
+                start = float(getattr(seg, "start", 0.0))
+                end = float(getattr(seg, "end", 0.0))
+                text = (getattr(seg, "text", "") or "").strip()
+            if text:
+                segments.append({"start": start, "end": end, "text": text})
         if segments:
             return segments
-        full_text = (result.get("text") or "").strip()
+        full_text = (getattr(resp, "text", "") or "").strip()
+        if not full_text and resp is not None:
+            try:
+                full_text = (resp.get("text") or "").strip()
+            except Exception:
+                full_text = ""
+
+        if not full_text:
+            resp2 = _create_transcription(client, f, model=stt_model)
+            full_text = (getattr(resp2, "text", "") or "").strip()
         if not full_text:
             return []
         return _fallback_segments(full_text, base_dir, audio_path)
-    except Exception:
+
+
+def transcribe_with_whisper_local(audio_path, llm_config: Dict, base_dir: str):
+    """
+    Local transcription using openai-whisper python package.
+    ``audio_path`` is a file path or a 16 kHz mono float32 array.
+    Returns list of {start, end, text} segment dicts, [] when no speech was
+    recognised; errors propagate so a failed chunk is not taken for silence.
+    """
+    model_name = get_llm_setting(llm_config, "whisper_local_model") or "base"
+    language = (get_llm_setting(llm_config, "whisper_language") or "").strip() or None
+    pool = get_transcription_pool(llm_config)
+    if pool is not None:
+        result = pool.submit(run_whisper, audio_path, model_name, language).result()
+    else:
+        result = run_whisper(audio_path, model_name, language)
+    segments: List[dict] = []
+    for seg in (result.get("segments") or []):
+        text = (seg.get("text") or "").strip()
+        if not text:
+            continue
+        try:
+            start = float(seg.get("start", 0.0))
+            end = float(seg.get("end", 0.0))
+        except Exception:
+            start = float(seg.get("start") or 0.0) if hasattr(seg, "get") else 0.0
+            end = float(seg.get("end") or 0.0) if hasattr(seg, "get") else 0.0
+        segments.append({"start": start, "end": end, "text": text})
+    if segments:
+        return segments
+    full_text = (result.get("text") or "").strip()
+    if not full_text:
         return []
+    if isinstance(audio_path, str):
+        return _fallback_segments(full_text, base_dir, audio_path)
+    return _fallback_segments(
+        full_text, base_dir, None, duration=len(audio_path) / float(SAMPLE_RATE)
+    )
+
+
+def _float_setting(llm_config: Dict, key: str) -> float:
+    try:
+        return float(get_llm_setting(llm_config, key))
+    except (TypeError, ValueError):
+        return 0.0
 
 
 def transcribe_audio(audio_path: str, llm_config: Dict, base_dir: str):
+    """
+    Transcribe extracted audio; segment times are mapped back to the video
+    timeline when silence was removed during extraction.
+    """
+    segments = _transcribe_compressed(audio_path, llm_config, base_dir)
+    return load_time_map(audio_path).remap_segments(segments)
+
+
+def _transcribe_compressed(audio_path: str, llm_config: Dict, base_dir: str):
     mode = (get_llm_setting(llm_config, "stt_mode") or "api").strip().lower()
+    chunk_seconds = _float_setting(llm_config, "stt_chunk_seconds")
+    if chunk_seconds > 0:
+        duration = _probe_duration(audio_path, base_dir)
+        if duration > chunk_seconds + _float_setting(llm_config, "stt_chunk_overlap_seconds"):
+            return transcribe_chunked(audio_path, duration, llm_config, base_dir)
     if mode == "local":
         return transcribe_with_whisper_local(audio_path, llm_config, base_dir)
     return transcribe_with_openai(audio_path, llm_config, base_dir)
 
 
+def transcribe_chunked(
+    audio_path: str, duration: float, llm_config: Dict, base_dir: str
+) -> List[dict]:
+    """
+    Split long audio at quiet points into overlapping chunks, transcribe
+    them concurrently and stitch the segments back on the original timeline.
+    A chunk that fails raises instead of leaving a gap in the transcript.
+    """
+    mode = (get_llm_setting(llm_config, "stt_mode") or "api").strip().lower()
+    window = 0.1
+    chunks = plan_chunks(
+        duration,
+        _float_setting(llm_config, "stt_chunk_seconds"),
+        overlap_seconds=_float_setting(llm_config, "stt_chunk_overlap_seconds"),
+        energies=window_energies(audio_path, window),
+        window=window,
+    )
+    if mode == "local":
+        # In-process the cached model serves one chunk at a time; with a
+        # process pool each worker transcribes its own chunk.
+        parallelism = transcription_parallelism(llm_config)
+    else:
+        parallelism = max(1, int(_float_setting(llm_config, "stt_parallelism")))
+
+    with tempfile.TemporaryDirectory(prefix="stt-chunks-") as tmp_dir:
+
+        def _run(chunk):
+            samples = read_pcm(audio_path, chunk.start, chunk.end)
+            if mode == "local":
+                return chunk, transcribe_with_whisper_local(samples, llm_config, base_dir)
+            chunk_path = os.path.join(tmp_dir, f"chunk-{chunk.index:04d}.mp3")
+            write_pcm(chunk_path, samples)
+            try:
+                return chunk, transcribe_with_openai(chunk_path, llm_config, base_dir)
+            finally:
+                try:
+                    os.remove(chunk_path)
+                except OSError:
+                    pass
+
+        with ThreadPoolExecutor(max_workers=parallelism) as pool:
+            results = list(pool.map(_run, chunks))
+    return stitch_segments(results)
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def split_transcript(text: str, chunk_chars: int) -> List[str]:
+    """
+    Cut ``text`` into pieces of at most ``chunk_chars`` characters, preferring
+    sentence boundaries and falling back to word boundaries.
+    """
+    if chunk_chars <= 0 or len(text) <= chunk_chars:
+        return [text] if text else []
+    pieces: List[str] = []
+    for sentence in _SENTENCE_END.split(text):
+        if len(sentence) <= chunk_chars:
+            pieces.append(sentence)
+            continue
+        words = sentence.split()
+        current = ""
+        for word in words:
+            if current and len(current) + 1 + len(word) > chunk_chars:
+                pieces.append(current)
+                current = ""
+            current = f"{current} {word}" if current else word
+        if current:
+            pieces.append(current)
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _join_notes(notes: Sequence[str]) -> str:
+    return "\n\n".join(
+        f"Часть {i}:\n{note}" for i, note in enumerate(notes, start=1)
+    )
+
+
+def _group_notes(notes: Sequence[str], chunk_chars: int) -> List[List[str]]:
+    # Every group gets at least two notes so each reduce level shrinks.
+    groups: List[List[str]] = []
+    current: List[str] = []
+    size = 0
+    for note in notes:
+        if len(current) >= 2 and size + len(note) > chunk_chars:
+            groups.append(current)
+            current, size = [], 0
+        current.append(note)
+        size += len(note)
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].extend(current)
+        else:
+            groups.append(current)
+    return groups
+
+
+def summarize_chunked(
+    text: str,
+    client,
+    model: str,
+    config: Dict,
+    chunk_chars: int,
+    parallelism: int,
+) -> str:
+    """
+    Map-reduce summary: transcript windows are summarized concurrently, the
+    partial notes are merged level by level until they fit one prompt, and
+    the configured ``summary`` prompt produces the final text from them.
+    """
+    map_tpl = get_prompt_template(config, "summary_map")
+    reduce_tpl = get_prompt_template(config, "summary_reduce")
+    chunks = split_transcript(text, chunk_chars)
+
+    def _map(item):
+        index, chunk = item
+        prompt = (
+            map_tpl.replace("{part}", str(index))
+            .replace("{parts}", str(len(chunks)))
+            .replace("{transcript}", chunk)
+        )
+        return call_openai_text(client, model, prompt)
+
+    def _reduce(group):
+        return call_openai_text(
+            client, model, reduce_tpl.replace("{summaries}", _join_notes(group))
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, parallelism)) as pool:
+        notes = [n for n in pool.map(_map, enumerate(chunks, start=1)) if n]
+        while len(notes) > 1 and sum(len(n) for n in notes) > chunk_chars:
+            notes = [n for n in pool.map(_reduce, _group_notes(notes, chunk_chars)) if n]
+    if not notes:
+        return ""
+    final_tpl = get_prompt_template(config, "summary")
+    return call_openai_text(
+        client, model, final_tpl.replace("{transcript}", _join_notes(notes))
+    )
+
+
 def summarize_with_llm(
     text: str,
     filename: str,
@@ -208,17 +533,32 @@ def summarize_with_llm(
         client = get_openai_client(llm_config)
         model = get_llm_setting(llm_config, "openai_model")
         prompt_tpl = get_prompt_template(config, "summary")
-        input_text = prompt_tpl.replace("{transcript}", text)
+        chunk_chars = int(_float_setting(llm_config, "summary_chunk_chars"))
+        chunked = 0 < chunk_chars < len(text)
         logger(
             filename,
             {
                 "type": "summary_request",
                 "time": datetime.now().isoformat(timespec="seconds"),
                 "model": model,
-                "content": prompt_tpl,
+                "content": (
+                    get_prompt_template(config, "summary_map") if chunked else prompt_tpl
+                ),
             },
         )
-        summary = call_openai_text(client, model, input_text)
+        if chunked:
+            summary = summarize_chunked(
+                text,
+                client,
+                model,
+                config,
+                chunk_chars,
+                int(_float_setting(llm_config, "summary_parallelism")),
+            )
+        else:
+            summary = call_openai_text(
+                client, model, prompt_tpl.replace("{transcript}", text)
+            )
         if summary:
             logger(
                 filename,
@@ -265,6 +605,8 @@ def generate_suggestions_with_llm(
     llm_config: Dict,
     config: Dict,
     logger: Callable[[str, dict], None],
+    min_count: Optional[int] = None,
+    use_cache: bool = True,
 ) -> List[dict]:
     api_key = llm_config.get("openai_api_key")
     if not api_key or OpenAI is None:
@@ -283,10 +625,11 @@ def generate_suggestions_with_llm(
     max_words = int((config.get("suggestions_max_words") or 6))
     div = int((config.get("suggestions_min_count_divider") or 20))
     extra = int((config.get("suggestions_min_count_extra") or 10))
-    try:
-        min_count = int((subs_count or 0) // max(1, div)) + extra
-    except Exception:
-        min_count = extra
+    if min_count is None:
+        try:
+            min_count = int((subs_count or 0) // max(1, div)) + extra
+        except Exception:
+            min_count = extra
 
     user_prompt = (
         tpl.replace("{timecoded_transcript}", timecoded_transcript)
@@ -311,21 +654,10 @@ def generate_suggestions_with_llm(
 
     last_err = None
     answer = ""
-    for attempt in range(3):
-        try:
-            chat = client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": user_prompt}],
-            )
-            answer = (chat.choices[0].message.content or "").strip()
-            break
-        except Exception as e:
-            last_err = e
-            msg = str(e)
-            if "429" in msg or "rate" in msg.lower():
-                time.sleep(1.5 * (attempt + 1))
-                continue
-            break
+    try:
+        answer = call_openai_text(client, model, user_prompt, use_cache=use_cache)
+    except Exception as e:
+        last_err = e
     now = datetime.now().isoformat(timespec="seconds")
     if not answer:
         logger(
@@ -342,6 +674,10 @@ def generate_suggestions_with_llm(
         {"type": "suggestions_response", "time": now, "content": answer},
     )
 
+    return _parse_suggestions(answer)
+
+
+def _parse_suggestions(answer: str) -> List[dict]:
     parsed = None
     try:
         parsed = json.loads(answer)
@@ -376,3 +712,187 @@ def generate_suggestions_with_llm(
                 )
     return items
 
+
+def _hms_to_seconds(value) -> Optional[float]:
+    parts = str(value or "").strip().split(":")
+    try:
+        numbers = [float(p) for p in parts]
+    except ValueError:
+        return None
+    if not numbers or len(numbers) > 3:
+        return None
+    seconds = 0.0
+    for number in numbers:
+        seconds = seconds * 60 + number
+    return seconds
+
+
+def _seconds_to_hms(sec: float) -> str:
+    sec = max(0, int(sec or 0))
+    return f"{sec // 3600:02d}:{(sec % 3600) // 60:02d}:{sec % 60:02d}"
+
+
+def _normalize_question(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def _similar_questions(a: str, b: str, threshold: float) -> bool:
+    if a == b:
+        return True
+    words_a, words_b = set(a.split()), set(b.split())
+    if words_a and words_b:
+        jaccard = len(words_a & words_b) / len(words_a | words_b)
+        if jaccard >= threshold:
+            return True
+    return difflib.SequenceMatcher(None, a, b).ratio() >= threshold
+
+
+def merge_suggestions(
+    items: Sequence[dict],
+    duration: float,
+    min_duration: float,
+    max_words: int,
+    similarity: float = 0.8,
+) -> List[dict]:
+    """
+    Validate, de-duplicate and sort suggestions from several windows.
+
+    Items with unparseable times or overlong text are dropped, intervals are
+    clamped to the lecture and stretched to ``min_duration``. Questions whose
+    wording is similar and whose intervals touch are merged into one item
+    covering both intervals.
+    """
+    valid = []
+    for item in items:
+        text = " ".join(str(item.get("text") or "").split())
+        start = _hms_to_seconds(item.get("start"))
+        end = _hms_to_seconds(item.get("end"))
+        if not text or start is None or end is None:
+            continue
+        if len(text.split()) > max(1, max_words) * 2:
+            continue
+        if duration > 0:
+            start = min(max(0.0, start), duration)
+            end = min(max(start, end), duration)
+        if end - start < min_duration:
+            end = start + min_duration
+            if duration > 0 and end > duration:
+                end = duration
+                start = max(0.0, end - min_duration)
+        valid.append(
+            {"text": text, "start": start, "end": end, "key": _normalize_question(text)}
+        )
+    valid.sort(key=lambda it: it["start"])
+
+    merged: List[dict] = []
+    for item in valid:
+        for kept in merged:
+            touches = (
+                item["start"] <= kept["end"] + min_duration
+                and kept["start"] <= item["end"] + min_duration
+            )
+            if touches and _similar_questions(item["key"], kept["key"], similarity):
+                kept["start"] = min(kept["start"], item["start"])
+                kept["end"] = max(kept["end"], item["end"])
+                break
+        else:
+            merged.append(item)
+    return [
+        {
+            "text": it["text"],
+            "start": _seconds_to_hms(it["start"]),
+            "end": _seconds_to_hms(it["end"]),
+        }
+        for it in merged
+    ]
+
+
+def plan_suggestion_windows(
+    segments: Sequence[dict], window_sec: float, overlap_sec: float
+) -> List[List[dict]]:
+    """
+    Group subtitle segments into overlapping time windows.
+    """
+    if not segments:
+        return []
+    duration = max(float(seg.get("end", seg.get("start", 0)) or 0) for seg in segments)
+    if window_sec <= 0 or duration <= window_sec:
+        return [list(segments)]
+    overlap_sec = min(max(0.0, overlap_sec), window_sec / 2)
+    step = window_sec - overlap_sec
+    windows = []
+    start = 0.0
+    while start < duration:
+        end = start + window_sec
+        window = [
+            seg
+            for seg in segments
+            if start <= float(seg.get("start", 0) or 0) < end
+        ]
+        if window:
+            windows.append(window)
+        if end >= duration:
+            break
+        start += step
+    return windows
+
+
+def generate_suggestions(
+    segments: Sequence[dict],
+    filename: str,
+    llm_config: Dict,
+    config: Dict,
+    logger: Callable[[str, dict], None],
+) -> List[dict]:
+    """
+    Generate suggestions per time window in parallel and merge them.
+
+    Each window gets its own slice of the time-coded transcript and a share
+    of the minimum question count; a window that comes back with less than
+    half of its share is asked once more. Lectures shorter than
+    ``suggestions_window_sec`` are handled by a single request as before.
+    """
+    window_sec = float(config.get("suggestions_window_sec", 600) or 0)
+    overlap_sec = float(config.get("suggestions_window_overlap_sec", 60) or 0)
+    parallelism = max(1, int(config.get("suggestions_parallelism", 4) or 1))
+    min_dur_sec = int((config.get("suggestions_min_duration_sec") or 60))
+    max_words = int((config.get("suggestions_max_words") or 6))
+    div = int((config.get("suggestions_min_count_divider") or 20))
+    extra = int((config.get("suggestions_min_count_extra") or 10))
+
+    windows = plan_suggestion_windows(segments, window_sec, overlap_sec)
+    if not windows:
+        return []
+    total = len(segments)
+
+    def _run(window: List[dict]) -> List[dict]:
+        share = max(2, math.ceil(extra * len(window) / max(1, total)))
+        min_count = len(window) // max(1, div) + share
+        items: List[dict] = []
+        for attempt in range(2):
+            # The second request must reach the model, not the cached answer.
+            items.extend(
+                generate_suggestions_with_llm(
+                    build_timecoded_transcript(window),
+                    filename,
+                    len(window),
+                    llm_config,
+                    config,
+                    logger,
+                    min_count=min_count,
+                    use_cache=attempt == 0,
+                )
+            )
+            if len(items) * 2 >= min_count:
+                break
+        return items
+
+    with ThreadPoolExecutor(max_workers=min(parallelism, len(windows))) as pool:
+        results = list(pool.map(_run, windows))
+    duration = max(float(seg.get("end", seg.get("start", 0)) or 0) for seg in segments)
+    return merge_suggestions(
+        [item for items in results for item in items],
+        duration,
+        float(min_dur_sec),
+        max_words,
+    )
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from config_manager import get_llm_setting
+
+_IMAGE_PREFIX = "data:"
+_CREATED_RE = re.compile(rb'"created":\s*([0-9.eE+-]+)')
+
+
+def _hash_images(value: Any) -> Any:
+    """
+    Replace inline data URLs with their SHA-256 so keys stay small while
+    still depending on every image byte.
+    """
+    if isinstance(value, str) and value.startswith(_IMAGE_PREFIX):
+        return "sha256:" + hashlib.sha256(value.encode("utf-8")).hexdigest()
+    if isinstance(value, dict):
+        return {k: _hash_images(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_hash_images(v) for v in value]
+    return value
+
+
+def cache_key(endpoint: str, model: str, payload: Any) -> str:
+    canonical = json.dumps(
+        [endpoint, model, _hash_images(payload)],
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Content-addressed LLM response cache on local disk.
+
+    One JSON file per (endpoint, model, prompt) key under
+    ``<directory>/<aa>/<key>.json``. Entries whose stored ``created`` time
+    is older than ``ttl_seconds`` are ignored and removed on read and on
+    eviction; when the directory grows past ``max_bytes`` the least
+    recently used files (by mtime, refreshed on every hit) are deleted. Several processes may share the directory:
+    writes go through a temporary file and ``os.replace``.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("llmath_video.llm_cache")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def configure(
+        self, directory: Optional[str], ttl_seconds: float, max_bytes: int
+    ):
+        with self._lock:
+            self.directory = directory
+            self.ttl_seconds = float(ttl_seconds)
+            self.max_bytes = int(max_bytes)
+            self._size = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        age = time.time() - entry.get("created", 0)
+        if self.ttl_seconds > 0 and age > self.ttl_seconds:
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry.get("response")
+
+    def put(self, key: str, response: str, endpoint: str = "", model: str = ""):
+        if not self.enabled or not response:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        # ``created`` goes first so eviction can read it from the file head.
+        data = json.dumps(
+            {
+                "created": time.time(),
+                "endpoint": endpoint,
+                "model": model,
+                "response": response,
+            },
+            ensure_ascii=False,
+        )
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            self.logger.exception("llm cache write failed: key=%s", key)
+            self._remove(tmp_path)
+            return
+        with self._lock:
+            self.writes += 1
+            if self._size is not None:
+                self._size += len(data.encode("utf-8"))
+            over = self._size is None or self._size > self.max_bytes
+        if over and self.max_bytes > 0:
+            self.evict()
+
+    def _remove(self, path: str) -> int:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _created(path: str) -> Optional[float]:
+        try:
+            with open(path, "rb") as f:
+                match = _CREATED_RE.search(f.read(1024))
+                if match is None:
+                    f.seek(0)
+                    return float(json.load(f).get("created", 0))
+            return float(match.group(1))
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def evict(self) -> int:
+        """
+        Drop expired entries, then least recently used ones until the cache
+        is under 90% of ``max_bytes``. Returns the number of removed files.
+        """
+        if not self.enabled or not os.path.isdir(self.directory):
+            return 0
+        entries = []
+        total = 0
+        now = time.time()
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        entries.sort()
+        removed = 0
+        target = int(self.max_bytes * 0.9) if self.max_bytes > 0 else None
+        for _, size, path in entries:
+            expired = False
+            if self.ttl_seconds > 0:
+                # The same clock as ``get``: hits refresh mtime, not age.
+                created = self._created(path)
+                expired = created is not None and now - created > self.ttl_seconds
+            if not expired and (target is None or total <= target):
+                continue
+            if self._remove(path):
+                total -= size
+                removed += 1
+        with self._lock:
+            self._size = total
+            self.evictions += removed
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "size_mb": round((self._size or 0) / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def configure_response_cache(llm_config: Dict, directory: str) -> ResponseCache:
+    """
+    Apply ``llm_cache_*`` settings to the process-wide cache.
+    """
+    flag = get_llm_setting(llm_config, "llm_cache_enabled").strip().lower()
+    enabled = flag in {"1", "true", "yes", "on"}
+    try:
+        ttl = float(get_llm_setting(llm_config, "llm_cache_ttl_seconds"))
+    except ValueError:
+        ttl = 0.0
+    try:
+        max_mb = float(get_llm_setting(llm_config, "llm_cache_max_mb"))
+    except ValueError:
+        max_mb = 0.0
+    response_cache.configure(
+        directory if enabled else None, ttl, int(max_mb * 1024 * 1024)
+    )
+    return response_cache
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Dict, Tuple
+
+from openai import OpenAI
+
+from config_manager import get_llm_setting
+
+try:
+    import httpx
+except Exception:
+    httpx = None
+
+
+def _float_setting(llm_config: Dict, key: str) -> float:
+    try:
+        return float(get_llm_setting(llm_config, key))
+    except ValueError:
+        return 0.0
+
+
+class OpenAIClientRegistry:
+    """
+    Process-wide OpenAI clients keyed by (base_url, api_key).
+
+    Each client owns one keep-alive HTTP connection pool, so summaries,
+    suggestions, chat and frame requests to the same endpoint reuse warm
+    TLS connections instead of opening a new pool per call. The registry is
+    reset in a forked child so processes never share sockets.
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str], object] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.created = 0
+        self.reused = 0
+        self.logger = logging.getLogger("llmath_video.openai_clients")
+
+    def _http_client(self, llm_config: Dict):
+        if httpx is None:
+            return None
+        max_connections = int(_float_setting(llm_config, "openai_max_connections"))
+        keepalive = int(_float_setting(llm_config, "openai_keepalive_connections"))
+        return httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections or None,
+                max_keepalive_connections=keepalive or None,
+                keepalive_expiry=_float_setting(llm_config, "openai_keepalive_seconds")
+                or None,
+            ),
+            timeout=self._timeout(llm_config),
+            follow_redirects=True,
+        )
+
+    def _timeout(self, llm_config: Dict):
+        read = _float_setting(llm_config, "openai_timeout_seconds") or None
+        connect = _float_setting(llm_config, "openai_connect_timeout_seconds") or None
+        if httpx is None:
+            return read
+        return httpx.Timeout(read, connect=connect)
+
+    def get(self, llm_config: Dict, base_url: str, api_key: str):
+        key = (base_url.rstrip("/"), api_key)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._clients = {}
+                self._pid = os.getpid()
+            client = self._clients.get(key)
+            if client is not None:
+                self.reused += 1
+                return client
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=self._timeout(llm_config),
+                # Retries and 429 handling go through the shared rate limiter
+                # (chat and speech-to-text requests alike, see llm.py).
+                max_retries=0,
+                http_client=self._http_client(llm_config),
+            )
+            self._clients[key] = client
+            self.created += 1
+            self.logger.info("openai client created: base_url=%s", key[0])
+            return client
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "created": self.created,
+                "reused": self.reused,
+            }
+
+
+openai_clients = OpenAIClientRegistry()
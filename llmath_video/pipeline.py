@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+STAGE_DONE = "done"
+STAGE_SKIPPED = "skipped"
+STAGE_FAILED = "failed"
+STAGE_BLOCKED = "blocked"
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One step of video processing.
+
+    ``is_done`` reports whether the stage's artifact already exists (the
+    stage is then skipped); ``run`` produces it or raises. ``lane`` names
+    the concurrency limit the stage runs under.
+    """
+
+    name: str
+    run: Callable[[], None]
+    is_done: Callable[[], bool]
+    lane: str = "cpu"
+    depends_on: Tuple[str, ...] = ()
+    retries: int = 0
+
+
+class StageGraph:
+    """
+    Runs stages as soon as all of their dependencies are done or skipped,
+    so independent stages (summary and suggestions after transcription)
+    overlap. A failed stage is retried ``stage.retries`` times; stages that
+    depend on a failed one are marked blocked unless their own artifact
+    already exists.
+    """
+
+    def __init__(self, stages: Sequence[Stage]):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("duplicate stage names")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        state: Dict[str, int] = {}
+
+        def visit(name: str, path: Tuple[str, ...]):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"stage cycle: {' -> '.join(path + (name,))}")
+            stage = self.stages.get(name)
+            if stage is None:
+                raise ValueError(f"unknown stage dependency: {name}")
+            state[name] = 1
+            for dep in stage.depends_on:
+                visit(dep, path + (name,))
+            state[name] = 2
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, ())
+        return order
+
+    def run(
+        self,
+        execute: Optional[Callable[[Stage], None]] = None,
+        on_event: Optional[Callable[[Stage, str, Optional[BaseException]], None]] = None,
+        retry_delay: float = 0.0,
+        should_stop: Optional[Callable[[], bool]] = None,
+    ) -> Dict[str, str]:
+        """
+        Execute the graph and return the final status of every stage.
+
+        ``execute`` wraps the call to ``stage.run`` (for example to take a
+        concurrency slot); ``on_event`` receives ``skip``, ``retry``,
+        ``error`` and ``blocked`` notifications.
+        """
+        execute = execute or (lambda stage: stage.run())
+        notify = on_event or (lambda stage, event, error: None)
+        results: Dict[str, str] = {}
+
+        def attempt(stage: Stage) -> str:
+            tries = 0
+            while True:
+                try:
+                    execute(stage)
+                    return STAGE_DONE
+                except Exception as e:
+                    stopping = should_stop is not None and should_stop()
+                    if tries >= stage.retries or stopping:
+                        notify(stage, "error", e)
+                        return STAGE_FAILED
+                    tries += 1
+                    notify(stage, "retry", e)
+                    if retry_delay > 0:
+                        time.sleep(retry_delay * tries)
+
+        pending = list(self.order)
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(
+            max_workers=max(1, len(self.stages)), thread_name_prefix="stage"
+        ) as pool:
+            while pending or running:
+                for name in list(pending):
+                    stage = self.stages[name]
+                    deps = [results.get(dep) for dep in stage.depends_on]
+                    if any(dep is None for dep in deps):
+                        continue
+                    pending.remove(name)
+                    if stage.is_done():
+                        notify(stage, "skip", None)
+                        results[name] = STAGE_SKIPPED
+                    elif any(dep in (STAGE_FAILED, STAGE_BLOCKED) for dep in deps):
+                        notify(stage, "blocked", None)
+                        results[name] = STAGE_BLOCKED
+                    else:
+                        running[pool.submit(attempt, stage)] = name
+                if not running:
+                    # Pending is in dependency order, so one pass resolves
+                    # every stage whose dependencies were skipped or blocked.
+                    if pending:
+                        raise RuntimeError("stage graph stalled")
+                    break
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[running.pop(future)] = future.result()
+        return {name: results[name] for name in self.order}
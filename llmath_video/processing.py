@@ -1,23 +1,42 @@
 from __future__ import annotations
 
-import json
 import os
 import shutil
-import subprocess
+import socket
 import threading
+import time
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Iterable, Optional
-import av
-from av.audio.resampler import AudioResampler
+from typing import Callable, Dict, List, Optional
 
 
+from config_manager import get_llm_setting, get_processing_setting
+
+from .audio import (
+    AUDIO_CODEC_EXTENSIONS,
+    SilenceCompressor,
+    extract_audio,
+    time_map_path_for,
+)
+from .jobs import JobStore
+from .pipeline import Stage, StageGraph
+from .rate_limit import PRIORITY_BACKGROUND
 from .llm import (
-    build_timecoded_transcript,
-    generate_suggestions_with_llm,
+    generate_suggestions,
     summarize_with_llm,
     transcribe_audio,
 )
-from .storage import LogStore, SummaryStore
+from .storage import (
+    ContentIndex,
+    LogStore,
+    SubtitleStore,
+    SuggestionStore,
+    SummaryStore,
+    TranscriptIndexStore,
+)
+
+
 
 class ProcessingService:
     def __init__(
@@ -27,326 +46,486 @@ class ProcessingService:
         dirs: Dict[str, str],
         log_store: LogStore,
         summary_store: SummaryStore,
+        processing_config: Optional[Dict] = None,
+        job_store: Optional[JobStore] = None,
+        content_index: Optional[ContentIndex] = None,
+        transcript_index: Optional[TranscriptIndexStore] = None,
     ):
         self.llm_config = llm_config
         self.config = config
         self.dirs = dirs
         self.log_store = log_store
         self.summary_store = summary_store
-        self.processing_flags = set()
+        self.processing_config = processing_config or {}
+        self.job_store = job_store or JobStore(
+            os.path.join(dirs["state"], "jobs.sqlite3"),
+            max_attempts=get_processing_setting(self.processing_config, "max_attempts"),
+        )
+        self.content_index = content_index
+        self.transcript_index = transcript_index or TranscriptIndexStore(
+            dirs["index"], SubtitleStore(dirs["subtitles"])
+        )
+        self.subtitle_store = self.transcript_index.subtitle_store
+        self.suggestion_store = SuggestionStore(dirs["suggestions"])
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
         self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: list = []
+        self._heartbeat: Optional[threading.Thread] = None
+        self._heartbeat_stopping = threading.Event()
+        self._active_stages: Dict[str, Dict[str, bool]] = {}
+        self._lease_seconds = max(
+            10.0, get_processing_setting(self.processing_config, "lease_seconds")
+        )
+        self._stage_limits = {
+            "cpu": max(1, get_processing_setting(self.processing_config, "cpu_concurrency")),
+            "network": max(1, get_processing_setting(self.processing_config, "network_concurrency")),
+        }
+        self._stage_slots = {
+            lane: threading.BoundedSemaphore(limit)
+            for lane, limit in self._stage_limits.items()
+        }
 
     def append_log(self, filename: str, entry: dict):
         self.log_store.append(filename, entry)
 
-    def queue(self, video_path: str, force: bool = False):
-        key = os.path.abspath(video_path)
+    def queue(
+        self,
+        video_path: str,
+        force: bool = False,
+        priority: int = PRIORITY_BACKGROUND,
+    ):
         if not force:
             if not self._needs_work(video_path):
                 return
+        name = os.path.basename(video_path)
+        added = self.job_store.enqueue(name, priority)
+        self._wakeup.set()
+        if not added:
+            return
         try:
-            name = os.path.basename(video_path)
             self.append_log(
                 name,
                 {
                     "type": "info",
                     "time": datetime.now().isoformat(timespec="seconds"),
-                    "content": "queue: added to processing",
+                    "content": f"queue: added to processing (priority={priority})",
                 },
             )
         except Exception:
             pass
+
+    def status(self) -> Dict:
+        jobs = self.job_store.list_active()
+        queued = [j["name"] for j in jobs if j["status"] == "queued"]
+        running = {j["name"]: j["stage"] for j in jobs if j["status"] == "running"}
+        with self._lock:
+            workers = len(self._threads)
+        return {
+            "queue_depth": len(queued),
+            "queued": queued,
+            "running": running,
+            "workers": workers,
+            "limits": dict(self._stage_limits),
+        }
+
+    def start(self):
+        """
+        Start the worker threads and the lease heartbeat for this process.
+        Jobs left behind by a crashed or restarted process are picked up once
+        their lease expires.
+        """
+        size = max(1, get_processing_setting(self.processing_config, "workers"))
         with self._lock:
-            if key in self.processing_flags:
+            if self._threads:
                 return
-            self.processing_flags.add(key)
-        thread = threading.Thread(
-            target=self._worker,
-            args=(video_path,),
-            name=f"process:{os.path.basename(video_path)}",
-            daemon=True,
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat_stopping.clear()
+                self._heartbeat = threading.Thread(
+                    target=self._heartbeat_loop, name="process-heartbeat", daemon=True
+                )
+                self._heartbeat.start()
+            self._stopping.clear()
+            for idx in range(size):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"process-worker-{idx + 1}",
+                    daemon=True,
+                )
+                self._threads.append(thread)
+                thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop claiming new jobs and wait for the running ones to finish.
+        Returns False if some jobs were still running after ``timeout``;
+        their leases expire and another process resumes them.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        with self._lock:
+            threads = list(self._threads)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            thread.join(remaining)
+        # Leases are renewed while running jobs drain; after that the
+        # heartbeat stops so the leases of unfinished jobs can expire.
+        self._heartbeat_stopping.set()
+        with self._lock:
+            heartbeat = self._heartbeat
+            self._threads = [t for t in self._threads if t.is_alive()]
+            stopped = not self._threads
+        if heartbeat is not None:
+            heartbeat.join()
+        return stopped
+
+    def _heartbeat_loop(self):
+        interval = self._lease_seconds / 3.0
+        while not self._heartbeat_stopping.wait(interval):
+            try:
+                self.job_store.renew(self.owner, self._lease_seconds)
+            except Exception:
+                pass
+
+    def _worker_loop(self):
+        poll_interval = max(0.1, get_processing_setting(self.processing_config, "poll_interval"))
+        while not self._stopping.is_set():
+            try:
+                job = self.job_store.claim(self.owner, self._lease_seconds)
+            except Exception:
+                job = None
+            if job is None:
+                self._wakeup.wait(poll_interval)
+                self._wakeup.clear()
+                continue
+            name = job["name"]
+            if job["stage"]:
+                self.append_log(
+                    name,
+                    {
+                        "type": "info",
+                        "time": datetime.now().isoformat(timespec="seconds"),
+                        "content": f"queue: resuming interrupted job at stage={job['stage']}",
+                    },
+                )
+            video_path = os.path.join(self.dirs["video"], name)
+            error = None
+            try:
+                if os.path.isfile(video_path):
+                    self._worker(video_path)
+                    if self._needs_work(video_path):
+                        error = "incomplete: some artifacts were not produced"
+                else:
+                    error = "video file not found"
+            except Exception as e:
+                error = str(e)
+            try:
+                self.job_store.finish(name, self.owner, error)
+            except Exception:
+                pass
+
+    def _publish_stages(self, name: str):
+        with self._lock:
+            active = self._active_stages.get(name) or {}
+            label = ",".join(f"{s}:waiting" if w else s for s, w in sorted(active.items()))
+        self.job_store.set_stage(name, self.owner, label)
+
+    @contextmanager
+    def _stage(self, save_path: str, stage: str, lane: str):
+        """
+        Hold a ``lane`` slot while ``stage`` runs. The job's stage column
+        lists every stage of the video in flight, marking those still
+        waiting for a slot.
+        """
+        name = os.path.basename(save_path)
+        with self._lock:
+            self._active_stages.setdefault(name, {})[stage] = True
+        try:
+            self._publish_stages(name)
+            with self._stage_slots[lane]:
+                with self._lock:
+                    self._active_stages[name][stage] = False
+                self._publish_stages(name)
+                yield
+        finally:
+            with self._lock:
+                active = self._active_stages.get(name) or {}
+                active.pop(stage, None)
+                if not active:
+                    self._active_stages.pop(name, None)
+
+    def _run_stage(self, save_path: str, stage: Stage):
+        with self._stage(save_path, stage.name, stage.lane):
+            stage.run()
+
+    def _silence_compressor(self) -> Optional[SilenceCompressor]:
+        if not get_processing_setting(self.processing_config, "vad_enabled"):
+            return None
+        return SilenceCompressor(
+            threshold_db=get_processing_setting(self.processing_config, "vad_threshold_db"),
+            min_silence=get_processing_setting(self.processing_config, "vad_min_silence_seconds"),
+            keep_silence=get_processing_setting(self.processing_config, "vad_keep_silence_seconds"),
         )
-        thread.start()
+
+    def _stt_mode(self) -> str:
+        return (get_llm_setting(self.llm_config, "stt_mode") or "api").strip().lower()
+
+    def _transcribe_lane(self) -> str:
+        return "cpu" if self._stt_mode() == "local" else "network"
+
+    def _audio_format(self) -> str:
+        if self._stt_mode() == "local":
+            return "wav"
+        codec = str(get_processing_setting(self.processing_config, "audio_codec")).strip().lower()
+        return codec if codec in AUDIO_CODEC_EXTENSIONS else "mp3"
+
+    def _audio_path(self, name: str) -> str:
+        """
+        Audio artifact used for transcription. Local whisper reads 16-bit
+        PCM WAV straight from a memory map (compressed audio from an earlier
+        API run still works); API mode uploads compressed audio.
+        """
+        base, _ = os.path.splitext(os.path.basename(name))
+        fmt = self._audio_format()
+        codec = "pcm" if fmt == "wav" else fmt
+        preferred = AUDIO_CODEC_EXTENSIONS[codec]
+        extensions = [preferred] + [
+            ext for ext in ("mp3", "m4a", "ogg", "wav") if ext != preferred
+        ]
+        for ext in extensions:
+            path = os.path.join(self.dirs["audio"], f"{base}.{ext}")
+            if os.path.isfile(path):
+                return path
+        return os.path.join(self.dirs["audio"], f"{base}.{preferred}")
+
+    def _artifact_paths(self, name: str) -> list:
+        base, _ = os.path.splitext(name)
+        paths = [
+            os.path.join(self.dirs["subtitles"], f"{name}.json"),
+            os.path.join(self.dirs["summaries"], f"{name}.txt"),
+            os.path.join(self.dirs["suggestions"], f"{name}.json"),
+        ]
+        for ext in AUDIO_CODEC_EXTENSIONS.values():
+            audio = os.path.join(self.dirs["audio"], f"{base}.{ext}")
+            paths.extend([audio, time_map_path_for(audio)])
+        return paths
+
+    def _adopt_duplicate_artifacts(self, name: str) -> Optional[str]:
+        """
+        Reuse the artifacts of another video with identical content (for
+        example the same lecture uploaded before deduplication existed).
+        Returns the name of the video they were taken from.
+        """
+        if self.content_index is None:
+            return None
+        sha256 = self.content_index.hash_of(name)
+        if not sha256:
+            return None
+        targets = self._artifact_paths(name)
+        size = os.path.getsize(os.path.join(self.dirs["video"], name))
+        for other in self.content_index.names_for(sha256, size=size):
+            if other == name:
+                continue
+            adopted = False
+            for src, dst in zip(self._artifact_paths(other), targets):
+                if not os.path.isfile(src) or os.path.exists(dst):
+                    continue
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copy2(src, dst)
+                adopted = True
+            if adopted:
+                return other
+        return None
 
     def _needs_work(self, video_path: str) -> bool:
         name = os.path.basename(video_path)
-        base, _ = os.path.splitext(name)
-        mp3_path = os.path.join(self.dirs["audio"], f"{base}.mp3")
+        audio_path = self._audio_path(name)
         subs_json_path = os.path.join(self.dirs["subtitles"], f"{name}.json")
         summary_path = os.path.join(self.dirs["summaries"], f"{name}.txt")
         sugg_path = os.path.join(self.dirs["suggestions"], f"{name}.json")
-        for path in (mp3_path, subs_json_path, summary_path, sugg_path):
+        for path in (audio_path, subs_json_path, summary_path, sugg_path):
             if not os.path.isfile(path):
                 return True
         return False
 
-    def _worker(self, save_path: str):
-        name = os.path.basename(save_path)
-        base, _ = os.path.splitext(name)
-        mp3_path = os.path.join(self.dirs["audio"], f"{base}.mp3")
-        subs_json_path = os.path.join(self.dirs["subtitles"], f"{name}.json")
-        summary_path = os.path.join(self.dirs["summaries"], f"{name}.txt")
-        sugg_path = os.path.join(self.dirs["suggestions"], f"{name}.json")
-
+    def _log(self, name: str, content: str, kind: str = "info"):
         self.append_log(
             name,
             {
-                "type": "info",
+                "type": kind,
                 "time": datetime.now().isoformat(timespec="seconds"),
-                "content": f"worker_start: save_path={save_path}",
+                "content": content,
             },
         )
-        try:
-            try:
-                if not os.path.isfile(mp3_path):
-                    self.append_log(
-                        name,
-                        {
-                            "type": "info",
-                            "time": datetime.now().isoformat(timespec="seconds"),
-                            "content": "extract_audio",
-                        },
-                    )
-                    extract_audio_to_mp3(
-                        save_path, self.dirs["audio"], self.dirs["base"]
-                    )
-                    self.append_log(
-                        name,
-                        {
-                            "type": "info",
-                            "time": datetime.now().isoformat(timespec="seconds"),
-                            "content": f"extract_audio_done: {mp3_path}",
-                        },
-                    )
-                else:
-                    self.append_log(
-                        name,
-                        {
-                            "type": "info",
-                            "time": datetime.now().isoformat(timespec="seconds"),
-                            "content": "extract_audio_skip: mp3 already exists",
-                        },
-                    )
-            except Exception as e:
-                self.append_log(
-                    name,
-                    {
-                        "type": "error",
-                        "time": datetime.now().isoformat(timespec="seconds"),
-                        "content": f"extract_audio_error: {e}",
-                    },
-                )
-
-            segments = []
-            try:
-                if os.path.isfile(mp3_path) and not os.path.isfile(subs_json_path):
-                    self.append_log(
-                        name,
-                        {
-                            "type": "info",
-                            "time": datetime.now().isoformat(timespec="seconds"),
-                            "content": "transcribe_start",
-                        },
-                    )
-                    segments = transcribe_audio(
-                        mp3_path, self.llm_config, self.dirs["base"]
-                    )
-                    if segments:
-                        os.makedirs(self.dirs["subtitles"], exist_ok=True)
-                        with open(subs_json_path, "w", encoding="utf-8") as f:
-                            json.dump({"segments": segments}, f, ensure_ascii=False)
-                        self.append_log(
-                            name,
-                            {
-                                "type": "info",
-                                "time": datetime.now().isoformat(timespec="seconds"),
-                                "content": f"transcribe_done: segments={len(segments)}",
-                            },
-                        )
-                    else:
-                        self.append_log(
-                            name,
-                            {
-                                "type": "error",
-                                "time": datetime.now().isoformat(timespec="seconds"),
-                                "content": "transcribe_empty: no segments returned",
-                            },
-                        )
-                elif os.path.isfile(subs_json_path):
-                    self.append_log(
-                        name,
-                        {
-                            "type": "info",
-                            "time": datetime.now().isoformat(timespec="seconds"),
-                            "content": "transcribe_skip: subtitles already exist",
-                        },
-                    )
-            except Exception as e:
-                self.append_log(
-                    name,
-                    {
-                        "type": "error",
-                        "time": datetime.now().isoformat(timespec="seconds"),
-                        "content": f"transcribe_error: {e}",
-                    },
-                )
-
-            if not segments and os.path.isfile(subs_json_path):
-                try:
-                    with open(subs_json_path, "r", encoding="utf-8") as f:
-                        segments = (json.load(f).get("segments") or [])
-                except Exception:
-                    segments = []
-                self.append_log(
-                    name,
-                    {
-                        "type": "info",
-                        "time": datetime.now().isoformat(timespec="seconds"),
-                        "content": f"subtitles_loaded: segments={len(segments)}",
-                    },
-                )
-            full_text = " ".join(
-                [(s or {}).get("text", "") for s in (segments or [])]
-            ).strip()
 
-            try:
-                if full_text and not os.path.isfile(summary_path):
-                    self.append_log(
-                        name,
-                        {
-                            "type": "info",
-                            "time": datetime.now().isoformat(timespec="seconds"),
-                            "content": "summary_start",
-                        },
-                    )
-                    summary_text = summarize_with_llm(
-                        full_text, name, self.llm_config, self.config, self.append_log
-                    )
-                    if summary_text:
-                        os.makedirs(self.dirs["summaries"], exist_ok=True)
-                        self.summary_store.write(name, summary_text)
-                        self.append_log(
-                            name,
-                            {
-                                "type": "info",
-                                "time": datetime.now().isoformat(timespec="seconds"),
-                                "content": f"summary_done: chars={len(summary_text)}",
-                            },
-                        )
-                elif os.path.isfile(summary_path):
-                    self.append_log(
-                        name,
-                        {
-                            "type": "info",
-                            "time": datetime.now().isoformat(timespec="seconds"),
-                            "content": "summary_skip: already exists",
-                        },
-                    )
-            except Exception as e:
-                self.append_log(
-                    name,
-                    {
-                        "type": "error",
-                        "time": datetime.now().isoformat(timespec="seconds"),
-                        "content": f"summary_error: {e}",
-                    },
-                )
+    def _load_segments(self, name: str) -> list:
+        subs_json_path = os.path.join(self.dirs["subtitles"], f"{name}.json")
+        if not os.path.isfile(subs_json_path):
+            raise FileNotFoundError(subs_json_path)
+        return self.subtitle_store.read_segments(name)
 
-            try:
-                if segments and not os.path.isfile(sugg_path):
-                    self.append_log(
-                        name,
-                        {
-                            "type": "info",
-                            "time": datetime.now().isoformat(timespec="seconds"),
-                            "content": "suggestions_start",
-                        },
-                    )
-                    timecoded = build_timecoded_transcript(segments)
-                    items = generate_suggestions_with_llm(
-                        timecoded,
-                        name,
-                        subs_count=len(segments),
-                        llm_config=self.llm_config,
-                        config=self.config,
-                        logger=self.append_log,
-                    )
-                    if isinstance(items, list) and items:
-                        os.makedirs(self.dirs["suggestions"], exist_ok=True)
-                        with open(sugg_path, "w", encoding="utf-8") as f:
-                            json.dump({"items": items}, f, ensure_ascii=False)
-                        self.append_log(
-                            name,
-                            {
-                                "type": "info",
-                                "time": datetime.now().isoformat(timespec="seconds"),
-                                "content": f"suggestions_done: items={len(items)}",
-                            },
-                        )
-                elif os.path.isfile(sugg_path):
-                    self.append_log(
-                        name,
-                        {
-                            "type": "info",
-                            "time": datetime.now().isoformat(timespec="seconds"),
-                            "content": "suggestions_skip: already exists",
-                        },
-                    )
-            except Exception as e:
-                self.append_log(
-                    name,
-                    {
-                        "type": "error",
-                        "time": datetime.now().isoformat(timespec="seconds"),
-                        "content": f"suggestions_error: {e}",
-                    },
-                )
-        finally:
-            with self._lock:
-                self.processing_flags.discard(os.path.abspath(save_path))
-            self.append_log(
+    def _extract_stage(self, save_path: str):
+        name = os.path.basename(save_path)
+        self._log(name, "extract_audio")
+        silence = self._silence_compressor()
+        audio_path = extract_audio(
+            save_path,
+            self.dirs["audio"],
+            self.dirs["base"],
+            self._audio_format(),
+            silence,
+            stream_copy=get_processing_setting(
+                self.processing_config, "audio_stream_copy"
+            ),
+        )
+        if silence is not None and silence.removed_seconds:
+            self._log(
                 name,
-                {
-                    "type": "info",
-                    "time": datetime.now().isoformat(timespec="seconds"),
-                    "content": "worker_finish",
-                },
+                f"extract_audio_vad: removed_seconds={silence.removed_seconds:.1f}",
             )
+        self._log(name, f"extract_audio_done: {audio_path}")
+
+    def _transcribe_stage(self, save_path: str):
+        name = os.path.basename(save_path)
+        self._log(name, "transcribe_start")
+        segments = transcribe_audio(
+            self._audio_path(name), self.llm_config, self.dirs["base"]
+        )
+        if not segments:
+            raise RuntimeError("no segments returned")
+        self.subtitle_store.write_segments(name, segments)
+        self._log(name, f"transcribe_done: segments={len(segments)}")
 
+    def _index_stage(self, save_path: str):
+        name = os.path.basename(save_path)
+        index = self.transcript_index.build(name)
+        if index is None:
+            raise RuntimeError("subtitles not found")
+        self._log(name, f"index_done: segments={len(index)} terms={len(index.postings)}")
 
-def extract_audio_to_mp3(video_path: str, out_dir: str, base_dir: str) -> str:
-    base = os.path.splitext(os.path.basename(video_path))[0]
-    out_path = os.path.join(out_dir, f"{base}.mp3")
-    os.makedirs(out_dir, exist_ok=True)
-    in_container = av.open(video_path)
-    try:
-        audio_stream = None
-        for s in in_container.streams:
-            if s.type == "audio":
-                audio_stream = s
-                break
-        if audio_stream is None:
-            raise RuntimeError("No audio stream found in input")
-        out_container = av.open(out_path, mode="w")
+    def _summary_stage(self, save_path: str):
+        name = os.path.basename(save_path)
+        full_text = " ".join(
+            [(s or {}).get("text", "") for s in self._load_segments(name)]
+        ).strip()
+        if not full_text:
+            raise RuntimeError("transcript is empty")
+        self._log(name, "summary_start")
+        summary_text = summarize_with_llm(
+            full_text, name, self.llm_config, self.config, self.append_log
+        )
+        if not summary_text:
+            raise RuntimeError("empty summary")
+        os.makedirs(self.dirs["summaries"], exist_ok=True)
+        self.summary_store.write(name, summary_text)
+        self._log(name, f"summary_done: chars={len(summary_text)}")
+
+    def _suggestions_stage(self, save_path: str):
+        name = os.path.basename(save_path)
+        segments = self._load_segments(name)
+        if not segments:
+            raise RuntimeError("transcript is empty")
+        self._log(name, "suggestions_start")
+        items = generate_suggestions(
+            segments,
+            name,
+            llm_config=self.llm_config,
+            config=self.config,
+            logger=self.append_log,
+        )
+        if not (isinstance(items, list) and items):
+            raise RuntimeError("no suggestions returned")
+        self.suggestion_store.write_items(name, items)
+        self._log(name, f"suggestions_done: items={len(items)}")
+
+    def stages_for(self, save_path: str) -> List[Stage]:
+        """
+        Processing graph for one video: extract -> transcribe -> the search
+        index and the LLM stages, which only need the subtitles and run side
+        by side. Each stage is skipped when its artifact already exists.
+        """
+        name = os.path.basename(save_path)
+        retries = max(0, get_processing_setting(self.processing_config, "stage_retries"))
+
+        def exists(directory: str, filename: str) -> Callable[[], bool]:
+            return lambda: os.path.isfile(os.path.join(self.dirs[directory], filename))
+
+        return [
+            Stage(
+                "extract_audio",
+                run=lambda: self._extract_stage(save_path),
+                is_done=lambda: os.path.isfile(self._audio_path(name)),
+                lane="cpu",
+                retries=retries,
+            ),
+            Stage(
+                "transcribe",
+                run=lambda: self._transcribe_stage(save_path),
+                is_done=exists("subtitles", f"{name}.json"),
+                lane=self._transcribe_lane(),
+                depends_on=("extract_audio",),
+                retries=retries,
+            ),
+            Stage(
+                "index",
+                run=lambda: self._index_stage(save_path),
+                is_done=lambda: self.transcript_index.is_fresh(name),
+                lane="cpu",
+                depends_on=("transcribe",),
+                retries=retries,
+            ),
+            Stage(
+                "summary",
+                run=lambda: self._summary_stage(save_path),
+                is_done=exists("summaries", f"{name}.txt"),
+                lane="network",
+                depends_on=("transcribe",),
+                retries=retries,
+            ),
+            Stage(
+                "suggestions",
+                run=lambda: self._suggestions_stage(save_path),
+                is_done=exists("suggestions", f"{name}.json"),
+                lane="network",
+                depends_on=("transcribe",),
+                retries=retries,
+            ),
+        ]
+
+    def _worker(self, save_path: str) -> Dict[str, str]:
+        name = os.path.basename(save_path)
         try:
-            out_stream = out_container.add_stream("mp3", rate=16000)
-            out_stream.layout = "mono"
-            out_stream.bit_rate = 48000
-            resampler = AudioResampler(format="s16", layout="mono", rate=16000)
-            for packet in in_container.demux(audio_stream):
-                for frame in packet.decode():
-                    resampled = resampler.resample(frame)
-                    if resampled is None:
-                        continue
-                    frames = resampled if isinstance(resampled, list) else [resampled]
-                    for rf in frames:
-                        for out_packet in out_stream.encode(rf):
-                            out_container.mux(out_packet)
-            for out_packet in out_stream.encode(None):
-                out_container.mux(out_packet)
-        finally:
-            out_container.close()
-    finally:
-        in_container.close()
-    return out_path
+            source = self._adopt_duplicate_artifacts(name)
+            if source:
+                self._log(name, f"dedupe: reused artifacts of identical video {source}")
+        except Exception as e:
+            self._log(name, f"dedupe_error: {e}", "error")
 
+        def on_event(stage: Stage, event: str, error: Optional[BaseException]):
+            if event == "skip":
+                self._log(name, f"{stage.name}_skip: already exists")
+            elif event == "blocked":
+                self._log(name, f"{stage.name}_skip: a required stage failed", "error")
+            elif event == "retry":
+                self._log(name, f"{stage.name}_retry: {error}", "error")
+            else:
+                self._log(name, f"{stage.name}_error: {error}", "error")
+
+        self._log(name, f"worker_start: save_path={save_path}")
+        try:
+            graph = StageGraph(self.stages_for(save_path))
+            return graph.run(
+                execute=lambda stage: self._run_stage(save_path, stage),
+                on_event=on_event,
+                retry_delay=get_processing_setting(
+                    self.processing_config, "stage_retry_delay"
+                ),
+                should_stop=self._stopping.is_set,
+            )
+        finally:
+            self._log(name, "worker_finish")
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from config_manager import get_llm_setting
+
+# Lower values are served first; students waiting on an answer jump ahead of
+# background processing stages.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# Rough characters-per-token ratio used to estimate prompt size before the
+# provider reports actual usage.
+CHARS_PER_TOKEN = 3
+IMAGE_TOKENS = 1000
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at ``per_minute / 60`` per
+    second. ``per_minute <= 0`` means unlimited.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = max(0.0, float(per_minute))
+        self.level = self.per_minute
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+
+    def refill(self, now: float):
+        if self.unlimited:
+            return
+        elapsed = max(0.0, now - self.updated)
+        self.level = min(self.per_minute, self.level + elapsed * self.per_minute / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """
+        Seconds until ``amount`` can be taken while leaving ``reserve`` (a
+        fraction of capacity) in the bucket. An ``amount`` larger than the
+        usable capacity waits for a full bucket instead of forever.
+        """
+        if self.unlimited:
+            return 0.0
+        floor = self.per_minute * reserve
+        amount = min(amount, self.per_minute - floor)
+        missing = amount + floor - self.level
+        if missing <= 0:
+            return 0.0
+        return missing * 60.0 / self.per_minute
+
+    def take(self, amount: float):
+        if not self.unlimited:
+            self.level -= min(amount, self.per_minute)
+
+    def debit(self, amount: float):
+        if not self.unlimited:
+            self.level -= amount
+
+
+class RateLimiter:
+    """
+    Process-wide limiter for LLM requests: requests per minute and tokens
+    per minute, served strictly by priority. Background callers may not
+    dip into the last ``interactive_reserve`` share of either bucket, so a
+    student's question does not queue behind a batch of summaries. A 429
+    with ``Retry-After`` pauses every caller until the provider is ready.
+    """
+
+    def __init__(
+        self,
+        rpm: float = 0,
+        tpm: float = 0,
+        interactive_reserve: float = 0.2,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        backoff_max_seconds: float = 30.0,
+    ):
+        self._cond = threading.Condition()
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._cooldown_until = 0.0
+        self.waits = 0
+        self.throttled = 0
+        self.logger = logging.getLogger("llmath_video.rate_limit")
+        self.configure(
+            rpm, tpm, interactive_reserve, max_retries, backoff_seconds, backoff_max_seconds
+        )
+
+    def configure(
+        self,
+        rpm: float,
+        tpm: float,
+        interactive_reserve: float = 0.2,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        backoff_max_seconds: float = 30.0,
+    ):
+        with self._cond:
+            self.requests = TokenBucket(rpm)
+            self.tokens = TokenBucket(tpm)
+            self.interactive_reserve = min(0.9, max(0.0, float(interactive_reserve)))
+            self.max_retries = max(0, int(max_retries))
+            self.backoff_seconds = max(0.1, float(backoff_seconds))
+            self.backoff_max_seconds = max(self.backoff_seconds, float(backoff_max_seconds))
+            self._cond.notify_all()
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Exponential backoff with full jitter: uniform between the base delay
+        and ``base * 2**attempt``, capped at ``backoff_max_seconds``.
+        """
+        upper = min(self.backoff_max_seconds, self.backoff_seconds * (2 ** attempt))
+        return random.uniform(self.backoff_seconds, upper)
+
+    def acquire(self, tokens: int, priority: int = PRIORITY_BACKGROUND) -> float:
+        """
+        Block until a request of ``tokens`` estimated tokens may be sent.
+        Returns the seconds spent waiting.
+        """
+        started = time.monotonic()
+        with self._cond:
+            if (
+                self.requests.unlimited
+                and self.tokens.unlimited
+                and self._cooldown_until <= started
+                and not self._waiters
+            ):
+                return 0.0
+            me = (priority, next(self._seq))
+            heapq.heappush(self._waiters, me)
+            self._cond.notify_all()
+            try:
+                while True:
+                    now = time.monotonic()
+                    timeout = None
+                    if self._waiters[0] == me:
+                        self.requests.refill(now)
+                        self.tokens.refill(now)
+                        reserve = self.interactive_reserve
+                        if priority <= PRIORITY_INTERACTIVE:
+                            reserve = 0.0
+                        timeout = max(
+                            self._cooldown_until - now,
+                            self.requests.wait_time(1, reserve),
+                            self.tokens.wait_time(tokens, reserve),
+                        )
+                        if timeout <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            break
+                    self._cond.wait(timeout)
+            finally:
+                self._waiters.remove(me)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+        waited = time.monotonic() - started
+        if waited > 0.05:
+            self.waits += 1
+        return waited
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """
+        Correct the token bucket once the provider reports real usage.
+        """
+        if actual is None:
+            return
+        with self._cond:
+            self.tokens.debit(actual - estimated)
+
+    def penalize(self, delay: float):
+        """
+        Hold every caller for ``delay`` seconds (a provider 429).
+        """
+        with self._cond:
+            self.throttled += 1
+            until = time.monotonic() + max(0.0, delay)
+            self._cooldown_until = max(self._cooldown_until, until)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "rpm": self.requests.per_minute,
+                "tpm": self.tokens.per_minute,
+                "waiting": len(self._waiters),
+                "waits": self.waits,
+                "throttled": self.throttled,
+                "cooldown_seconds": round(
+                    max(0.0, self._cooldown_until - time.monotonic()), 1
+                ),
+            }
+
+
+llm_limiter = RateLimiter()
+
+
+def configure_rate_limiter(llm_config: Dict) -> RateLimiter:
+    def _number(key: str) -> float:
+        try:
+            return float(get_llm_setting(llm_config, key))
+        except ValueError:
+            return 0.0
+
+    llm_limiter.configure(
+        _number("llm_rpm"),
+        _number("llm_tpm"),
+        _number("llm_interactive_reserve"),
+        int(_number("llm_max_retries")),
+        _number("llm_backoff_seconds"),
+        _number("llm_backoff_max_seconds"),
+    )
+    return llm_limiter
+
+
+def estimate_tokens(messages) -> int:
+    chars = 0
+    images = 0
+    for message in messages or []:
+        content = (message or {}).get("content")
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content or []:
+            if (part or {}).get("type") == "image_url":
+                images += 1
+            else:
+                chars += len(str((part or {}).get("text") or ""))
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKENS + 1
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Delay requested by the provider in ``Retry-After`` / ``retry-after-ms``
+    headers of a failed response, if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value:
+            return max(0.0, float(value) / 1000.0)
+        value = headers.get("retry-after")
+        if value:
+            return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status == 429 or status == 408 or status >= 500
+    name = type(error).__name__
+    return name in {"APIConnectionError", "APITimeoutError", "RateLimitError"}
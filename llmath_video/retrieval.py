@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import math
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Russian morphology without a stemmer: words are compared by their first
+# characters, which merges most case and number forms of the same term.
+STEM_LENGTH = 6
+
+STOPWORDS = frozenset(
+    """
+    а без более бы был была были было быть в вам вас ведь весь во вот все
+    всего всех вы где да даже для до его ее если есть еще же за здесь и из
+    или им их к как какая какой когда кто ли либо мне может мы на над надо
+    наш не него нее нет ни них но ну о об однако он она они оно от очень по
+    под при про с со так также такое там тем то тогда того тоже только том
+    тот ту тут у уж уже хотя чего чем что чтобы эта эти это этого этой этом этот
+    a an and are as at be by for from in is it of on or that the this to
+    was we with you
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for word in _TOKEN_RE.findall((text or "").lower().replace("ё", "е")):
+        if word in STOPWORDS:
+            continue
+        tokens.append(word[:STEM_LENGTH])
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 over transcript segments (one document per segment).
+
+    Postings are kept as ``term -> [(segment, tf), ...]`` so a query only
+    touches the segments that contain its terms. The index is plain data
+    and round-trips through ``to_dict`` / ``from_dict`` for persistence.
+    """
+
+    def __init__(
+        self,
+        postings: Dict[str, List[Tuple[int, int]]],
+        doc_lengths: Sequence[int],
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.postings = postings
+        self.doc_lengths = list(doc_lengths)
+        self.k1 = float(k1)
+        self.b = float(b)
+        total = sum(self.doc_lengths)
+        self.avg_length = total / len(self.doc_lengths) if self.doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = []
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc, tf))
+        return cls(postings, doc_lengths, k1, b)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        n = len(self.doc_lengths)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def search(
+        self, query: str, k: int, limit: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Top ``k`` segments for ``query`` as ``(segment, score)``, best first.
+        Only segments with index below ``limit`` are considered.
+        """
+        if k <= 0 or not self.doc_lengths:
+            return []
+        avg = self.avg_length or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for doc, tf in postings:
+                if limit is not None and doc >= limit:
+                    continue
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[doc] / avg)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:k]
+
+    def to_dict(self) -> Dict:
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "doc_lengths": self.doc_lengths,
+            "postings": {
+                term: [value for pair in pairs for value in pair]
+                for term, pairs in self.postings.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BM25Index":
+        postings = {
+            term: list(zip(flat[0::2], flat[1::2]))
+            for term, flat in (data.get("postings") or {}).items()
+        }
+        return cls(
+            postings,
+            data.get("doc_lengths") or [],
+            data.get("k1", 1.2),
+            data.get("b", 0.75),
+        )
+
+
+def _seconds(segment: dict, key: str) -> float:
+    try:
+        return float((segment or {}).get(key, 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _format_time(seconds: float) -> str:
+    total = max(0, int(seconds))
+    return f"{total // 3600:02d}:{(total % 3600) // 60:02d}:{total % 60:02d}"
+
+
+class SegmentIndex:
+    """
+    Time lookups over one lecture's subtitle segments.
+
+    Keeps the segment starts sorted next to cumulative offsets into the
+    space-joined transcript, so "text before t", "text in [a, b)" and
+    "segment at t" are a bisection plus a join of only the segments that
+    end up in the result. Build it once per subtitles version.
+    """
+
+    def __init__(self, segments: Sequence[dict]):
+        items = [
+            (
+                _seconds(seg, "start"),
+                _seconds(seg, "end"),
+                str((seg or {}).get("text", "") or ""),
+            )
+            for seg in segments or []
+        ]
+        if any(items[i][0] > items[i + 1][0] for i in range(len(items) - 1)):
+            items.sort(key=lambda item: item[0])
+        self.starts = [start for start, _, _ in items]
+        self.ends = [end for _, end, _ in items]
+        self.texts = [text for _, _, text in items]
+        # offsets[i] is where segment i begins in " ".join(self.texts).
+        self.offsets = [0]
+        for text in self.texts:
+            self.offsets.append(self.offsets[-1] + len(text) + 1)
+
+    @classmethod
+    def from_columns(cls, columns) -> "SegmentIndex":
+        """
+        Wrap already sorted columns (``starts``, ``ends``, ``texts``,
+        ``char_offsets``), e.g. a memory-mapped columnar subtitles file,
+        without copying them.
+        """
+        index = cls.__new__(cls)
+        index.starts = columns.starts
+        index.ends = columns.ends
+        index.texts = columns.texts
+        index.offsets = columns.char_offsets
+        return index
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def count_before(self, t: float) -> int:
+        """
+        Number of segments that start strictly before ``t``.
+        """
+        return bisect_left(self.starts, t)
+
+    def text_range(self, lo: int, hi: int, max_chars: Optional[int] = None) -> str:
+        """
+        Segments ``lo..hi-1`` joined with spaces; with ``max_chars`` only
+        the tail of that text, without joining the segments that precede it.
+        """
+        lo, hi = max(0, lo), min(len(self.texts), hi)
+        if lo >= hi:
+            return ""
+        end = self.offsets[hi] - 1
+        begin = self.offsets[lo]
+        if max_chars is not None:
+            begin = max(begin, end - max(0, max_chars))
+        first = max(lo, bisect_right(self.offsets, begin) - 1)
+        joined = getattr(self.texts, "joined", None)
+        text = joined(first, hi) if joined else " ".join(self.texts[first:hi])
+        return text[begin - self.offsets[first]:]
+
+    def text_before(self, t: float, max_chars: Optional[int] = None) -> str:
+        return self.text_range(0, self.count_before(t), max_chars)
+
+    def text_between(self, a: float, b: float, max_chars: Optional[int] = None) -> str:
+        """
+        Text of the segments that start in ``[a, b)``.
+        """
+        return self.text_range(self.count_before(a), self.count_before(b), max_chars)
+
+    def segments(self, lo: int, hi: int) -> List[dict]:
+        """
+        Segments ``lo..hi-1`` as plain dicts (the JSON export shape).
+        """
+        lo, hi = max(0, lo), min(len(self.starts), hi)
+        texts = self.texts[lo:hi]
+        return [
+            {"start": self.starts[i], "end": self.ends[i], "text": texts[i - lo]}
+            for i in range(lo, hi)
+        ]
+
+    def segment_at(self, t: float) -> Optional[int]:
+        """
+        Index of the segment playing at ``t``, or None between segments.
+        """
+        i = bisect_right(self.starts, t) - 1
+        if i < 0:
+            return None
+        if self.ends[i] > self.starts[i] and t >= self.ends[i]:
+            return None
+        return i
+
+
+def select_context(
+    segments: SegmentIndex,
+    index: Optional[BM25Index],
+    query: str,
+    current_time: float,
+    top_k: int = 6,
+    window_sec: float = 120.0,
+    max_chars: int = 3000,
+    neighbours: int = 1,
+) -> str:
+    """
+    Transcript context for a question asked at ``current_time``.
+
+    Combines the local window (segments of the last ``window_sec`` seconds
+    before the current position) with the ``top_k`` segments most relevant
+    to ``query`` among those already watched, each widened by
+    ``neighbours`` segments on both sides. The window takes up to half of
+    ``max_chars`` when there are hits; without an index or hits the text
+    right before ``current_time`` fills the whole budget. Fragments are
+    returned in time order, each prefixed with its time code.
+    """
+    limit = segments.count_before(current_time)
+    if limit == 0 or max_chars <= 0:
+        return ""
+
+    def text_of(i: int) -> str:
+        return segments.texts[i].strip()
+
+    hits: List[int] = []
+    if index is not None and len(index) == len(segments):
+        hits = [doc for doc, _ in index.search(query, top_k, limit=limit)]
+
+    selected: Dict[int, str] = {}
+    used = 0
+    window_cap = max_chars // 2 if hits else max_chars
+    first = segments.count_before(current_time - window_sec) if hits else 0
+    i = limit - 1
+    while i >= first:
+        text = text_of(i)
+        if used + len(text) > window_cap:
+            if not selected and text:
+                selected[i] = text[-window_cap:]
+                used += len(selected[i])
+            break
+        selected[i] = text
+        used += len(text) + 1
+        i -= 1
+
+    for doc in hits:
+        span = range(max(0, doc - neighbours), min(limit, doc + neighbours + 1))
+        texts = {j: text_of(j) for j in span if j not in selected}
+        cost = sum(len(t) + 1 for t in texts.values())
+        if used + cost > max_chars:
+            continue
+        selected.update(texts)
+        used += cost
+
+    parts: List[str] = []
+    group: List[str] = []
+    previous = None
+    for i in sorted(selected):
+        if previous is None or i != previous + 1:
+            if group:
+                parts.append(" ".join(group))
+            group = [f"[{_format_time(segments.starts[i])}]"]
+        if selected[i]:
+            group.append(selected[i])
+        previous = i
+    if group:
+        parts.append(" ".join(group))
+    return "\n\n".join(parts)
@@ -2,16 +2,21 @@ from __future__ import annotations
 
 import json
 import os
+import threading
+from concurrent.futures import Future
 from datetime import datetime
 
 from flask import Blueprint, jsonify
 
-from ..llm import build_timecoded_transcript, generate_suggestions_with_llm
+from ..compression import send_json_file
+from ..http_cache import conditional
+from ..llm import generate_suggestions
 from ..storage import (
     LogStore,
     SubtitleStore,
     SuggestionStore,
     SummaryStore,
+    file_cache,
 )
 
 
@@ -25,35 +30,71 @@ def register(
     config: dict,
 ):
     bp = Blueprint("content", __name__)
+    inflight: dict[str, Future] = {}
+    inflight_lock = threading.Lock()
+
+    def _generate_once(filename: str, segments) -> list:
+        """
+        Students opening a lecture at the same time share one generation
+        instead of each sending its own batch of LLM requests.
+        """
+        with inflight_lock:
+            future = inflight.get(filename)
+            owner = future is None
+            if owner:
+                future = Future()
+                inflight[filename] = future
+        if not owner:
+            try:
+                return future.result()
+            except Exception:
+                # The owning request has already logged the failure.
+                return []
+        try:
+            items = generate_suggestions(
+                segments,
+                filename,
+                llm_config=llm_config,
+                config=config,
+                logger=log_store.append,
+            )
+            if items:
+                suggestion_store.write_items(filename, items)
+            future.set_result(items)
+            return items
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with inflight_lock:
+                inflight.pop(filename, None)
 
     @bp.route("/summary/<path:filename>")
     def get_summary(filename):
-        text = summary_store.read(filename)
-        return jsonify({"text": text})
+        return conditional(
+            [summary_store.path_for(filename)],
+            lambda: jsonify({"text": summary_store.read(filename)}),
+        )
 
     @bp.route("/suggestions/<path:filename>")
     def get_suggestions(filename):
+        return conditional(
+            [suggestion_store.path_for(filename)], lambda: _suggestions(filename)
+        )
+
+    def _suggestions(filename: str):
         try:
             existing = suggestion_store.read(filename) or {}
         except Exception as exc:
             return jsonify({"items": [], "error": str(exc)}), 200
         items = existing.get("items")
         if isinstance(items, list) and items:
-            return jsonify({"items": items})
+            return send_json_file(suggestion_store.path_for(filename))
         try:
             segments = subtitle_store.read_segments(filename)
             if segments:
-                timecoded = build_timecoded_transcript(segments)
-                new_items = generate_suggestions_with_llm(
-                    timecoded,
-                    filename,
-                    subs_count=len(segments),
-                    llm_config=llm_config,
-                    config=config,
-                    logger=log_store.append,
-                )
+                new_items = _generate_once(filename, segments)
                 if new_items:
-                    suggestion_store.write_items(filename, new_items)
                     return jsonify({"items": new_items})
         except Exception as e:
             log_store.append(
@@ -66,6 +107,10 @@ def register(
             )
         return jsonify({"items": []})
 
+    @bp.route("/api/storage/cache", methods=["GET"])
+    def api_storage_cache_stats():
+        return jsonify(file_cache.stats())
+
     @bp.route("/logs/<path:filename>")
     def get_logs(filename):
         entries = log_store.read_entries(filename)
@@ -1,14 +1,33 @@
 from __future__ import annotations
 
 from datetime import datetime
+import json
 import logging
 
-from flask import Blueprint, jsonify, request, url_for
+from flask import (
+    Blueprint,
+    Response,
+    jsonify,
+    request,
+    stream_with_context,
+    url_for,
+)
 
 from config_manager import get_llm_setting, get_prompt_template
 
-from ..llm import call_openai_text, get_openai_client
-from ..storage import FrameStore, LogStore, SubtitleStore, SummaryStore
+from ..llm import chat_completion, get_openai_client, stream_chat_completion
+from ..llm_cache import response_cache
+from ..rate_limit import PRIORITY_INTERACTIVE, llm_limiter
+from ..retrieval import select_context
+from ..storage import (
+    FrameStore,
+    LogStore,
+    SubtitleStore,
+    SummaryStore,
+    TranscriptIndexStore,
+)
+
+LLM_ERROR_ANSWER = "Ошибка обращения к LLM"
 
 
 def register(
@@ -19,26 +38,20 @@ def register(
     log_store: LogStore,
     llm_config: dict,
     config: dict,
+    transcript_index: TranscriptIndexStore,
 ):
     bp = Blueprint("llm_api", __name__)
     logger = logging.getLogger("llmath_video.api")
 
-    @bp.route("/api/explain_frame", methods=["POST"])
-    def explain_frame():
-        data = request.get_json(silent=True) or {}
+    def _prepare_frame(data: dict) -> dict:
         name = data.get("name") or ""
         image_data_url = data.get("image") or ""
         current_time = float(data.get("currentTime") or 0)
-        api_key = llm_config.get("openai_api_key")
-        if not api_key:
-            return jsonify({"answer": "LLM не настроен"}), 200
 
         img_rel_path = frame_store.save_data_url(name, image_data_url)
 
         summary_text = summary_store.read(name)
-        subs_text = _subtitles_before_time(
-            subtitle_store.read_segments(name), current_time
-        )
+        subs_text = subtitle_store.segment_index(name).text_before(current_time)
 
         system = get_prompt_template(config, "frame_system")
         tpl = get_prompt_template(config, "frame_user_template")
@@ -63,73 +76,43 @@ def register(
                 "image_url": img_url_for_log,
             },
         )
-
-        answer = ""
-        last_err = None
-        for attempt in range(3):
-            try:
-                chat = client.chat.completions.create(
-                    model=model,
-                    messages=[
+        return {
+            "name": name,
+            "client": client,
+            "model": model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": f"{system}\n\n{user_prompt}"},
                         {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": f"{system}\n\n{user_prompt}"},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {"url": image_data_url},
-                                },
-                            ],
-                        }
+                            "type": "image_url",
+                            "image_url": {"url": image_data_url},
+                        },
                     ],
-                )
-                answer = (chat.choices[0].message.content or "").strip()
-                break
-            except Exception as e:
-                last_err = e
-                msg = str(e)
-                # Log full stack for debugging unexpected failures
-                logger.exception("explain_frame request failed: name=%s attempt=%s", name, attempt + 1)
-                if "429" in msg or "rate" in msg.lower():
-                    import time
-
-                    time.sleep(1.5 * (attempt + 1))
-                    continue
-                break
-
-        now = datetime.now().isoformat(timespec="seconds")
-        if answer:
-            log_store.append(
-                name,
-                {
-                    "type": "frame_response",
-                    "time": now,
-                    "content": answer,
-                    "image_url": img_url_for_log,
-                },
-            )
-            return jsonify({"answer": answer, "image_url": img_url_for_log})
-        err_text = str(last_err) if last_err else "Неизвестная ошибка LLM"
-        logger.error("explain_frame error: name=%s err=%s", name, err_text)
-        log_store.append(
-            name,
-            {"type": "error", "time": now, "content": err_text},
-        )
-        return jsonify({"answer": "Ошибка обращения к LLM"}), 200
+                }
+            ],
+            "response_type": "frame_response",
+            "extra": {"image_url": img_url_for_log},
+        }
 
-    @bp.route("/api/chat", methods=["POST"])
-    def api_chat():
-        data = request.get_json(silent=True) or {}
+    def _prepare_chat(data: dict) -> dict:
         name = data.get("name") or ""
         current_time = float(data.get("currentTime") or 0)
         dialog = data.get("dialog") or []
         question = data.get("question") or ""
-        api_key = llm_config.get("openai_api_key")
-        if not api_key:
-            return jsonify({"answer": "LLM не настроен"}), 200
 
-        segments = subtitle_store.read_segments(name)
-        subs_text = _subtitles_before_time(segments, current_time)[-3000:]
+        segments = subtitle_store.segment_index(name)
+        top_k = int(config.get("chat_context_top_k", 6) or 0)
+        subs_text = select_context(
+            segments,
+            transcript_index.get(name) if top_k > 0 and len(segments) else None,
+            question,
+            current_time,
+            top_k=top_k,
+            window_sec=float(config.get("chat_context_window_sec", 120) or 0),
+            max_chars=int(config.get("chat_context_max_chars", 3000) or 0),
+        )
         summary_text = summary_store.read(name)
 
         dialog_items = list(dialog or [])
@@ -169,37 +152,169 @@ def register(
             name,
             {"type": "chat_request", "time": now_req, "model": model, "content": prompt},
         )
+        return {
+            "name": name,
+            "client": client,
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "response_type": "chat_response",
+            "extra": {},
+        }
+
+    def _log_response(call: dict, answer: str, **fields):
+        log_store.append(
+            call["name"],
+            {
+                "type": call["response_type"],
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "content": answer,
+                **call["extra"],
+                **fields,
+            },
+        )
+
+    def _log_error(call: dict, err_text: str):
+        log_store.append(
+            call["name"],
+            {
+                "type": "error",
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "content": err_text,
+            },
+        )
+
+    def _answer(call: dict, data: dict):
+        answer = ""
+        last_err = None
         try:
-            answer = call_openai_text(client, model, prompt)
+            answer = chat_completion(
+                call["client"],
+                call["model"],
+                call["messages"],
+                use_cache=_use_cache(data),
+                priority=PRIORITY_INTERACTIVE,
+            )
         except Exception as e:
-            now = datetime.now().isoformat(timespec="seconds")
-            log_store.append(name, {"type": "error", "time": now, "content": str(e)})
-            logger.exception("chat request failed: name=%s", name)
-            return jsonify({"answer": "Ошибка обращения к LLM"}), 200
-        now = datetime.now().isoformat(timespec="seconds")
+            last_err = e
+            # Log full stack for debugging unexpected failures
+            logger.exception("%s failed: name=%s", call["response_type"], call["name"])
         if answer:
-            log_store.append(
-                name,
-                {"type": "chat_response", "time": now, "content": answer},
-            )
-            return jsonify({"answer": answer})
-        log_store.append(
-            name,
-            {"type": "error", "time": now, "content": "Не удалось получить ответ"},
+            _log_response(call, answer)
+            return jsonify({"answer": answer, **call["extra"]})
+        err_text = str(last_err) if last_err else "Не удалось получить ответ"
+        logger.error("%s error: name=%s err=%s", call["response_type"], call["name"], err_text)
+        _log_error(call, err_text)
+        return jsonify({"answer": LLM_ERROR_ANSWER}), 200
+
+    def _stream(call: dict, data: dict) -> Response:
+        """
+        Forward answer deltas as server-sent events::
+
+            event: delta  data: {"text": "..."}
+            event: done   data: {"answer": "<full text>", ...}
+            event: error  data: {"error": "..."}
+
+        The full answer is written to the log once the stream completes; if
+        the client disconnects midway, the part produced so far is logged
+        with ``"interrupted": true``.
+        """
+        use_cache = _use_cache(data)
+
+        def generate():
+            parts = []
+            finished = False
+            try:
+                # Sent before the first token so proxies flush headers early.
+                yield ": stream\n\n"
+                try:
+                    for delta in stream_chat_completion(
+                        call["client"],
+                        call["model"],
+                        call["messages"],
+                        use_cache=use_cache,
+                        priority=PRIORITY_INTERACTIVE,
+                    ):
+                        parts.append(delta)
+                        yield _sse_event("delta", {"text": delta})
+                except Exception as e:
+                    finished = True
+                    logger.exception(
+                        "%s stream failed: name=%s", call["response_type"], call["name"]
+                    )
+                    _log_error(call, str(e))
+                    yield _sse_event("error", {"error": LLM_ERROR_ANSWER})
+                    return
+                answer = "".join(parts).strip()
+                finished = True
+                if not answer:
+                    _log_error(call, "Не удалось получить ответ")
+                    yield _sse_event("error", {"error": LLM_ERROR_ANSWER})
+                    return
+                _log_response(call, answer)
+                yield _sse_event("done", {"answer": answer, **call["extra"]})
+            finally:
+                if not finished and parts:
+                    _log_response(call, "".join(parts).strip(), interrupted=True)
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    def _not_configured(stream: bool):
+        if not stream:
+            return jsonify({"answer": "LLM не настроен"}), 200
+        return Response(
+            _sse_event("done", {"answer": "LLM не настроен"}),
+            mimetype="text/event-stream",
         )
-        logger.error("chat error: name=%s err=%s", name, "Не удалось получить ответ")
-        return jsonify({"answer": "Ошибка обращения к LLM"}), 200
+
+    @bp.route("/api/explain_frame", methods=["POST"])
+    def explain_frame():
+        data = request.get_json(silent=True) or {}
+        if not llm_config.get("openai_api_key"):
+            return _not_configured(False)
+        return _answer(_prepare_frame(data), data)
+
+    @bp.route("/api/explain_frame/stream", methods=["POST"])
+    def explain_frame_stream():
+        data = request.get_json(silent=True) or {}
+        if not llm_config.get("openai_api_key"):
+            return _not_configured(True)
+        return _stream(_prepare_frame(data), data)
+
+    @bp.route("/api/chat", methods=["POST"])
+    def api_chat():
+        data = request.get_json(silent=True) or {}
+        if not llm_config.get("openai_api_key"):
+            return _not_configured(False)
+        return _answer(_prepare_chat(data), data)
+
+    @bp.route("/api/chat/stream", methods=["POST"])
+    def api_chat_stream():
+        data = request.get_json(silent=True) or {}
+        if not llm_config.get("openai_api_key"):
+            return _not_configured(True)
+        return _stream(_prepare_chat(data), data)
+
+    @bp.route("/api/llm/cache", methods=["GET"])
+    def api_llm_cache_stats():
+        return jsonify({**response_cache.stats(), "rate_limit": llm_limiter.stats()})
 
     app.register_blueprint(bp)
 
 
-def _subtitles_before_time(segments, current_time: float) -> str:
-    parts: list[str] = []
-    for item in segments or []:
-        try:
-            if float(item.get("start", 0)) < current_time:
-                parts.append(item.get("text", ""))
-        except Exception:
-            continue
-    return " ".join(parts)
+def _sse_event(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _use_cache(data: dict) -> bool:
+    """
+    Clients skip the response cache with ``"no_cache": true`` in the body
+    or a ``Cache-Control: no-cache`` header (e.g. "regenerate answer").
+    """
+    if data.get("no_cache"):
+        return False
+    return "no-cache" not in (request.headers.get("Cache-Control") or "").lower()
 
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import math
 import os
 
 from flask import (
@@ -10,8 +11,12 @@ from flask import (
     url_for,
 )
 
+from ..compression import send_json_file, sidecar_paths
+from ..http_cache import conditional
 from ..processing import ProcessingService
+from ..rate_limit import PRIORITY_INTERACTIVE
 from ..storage import FrameStore, SubtitleStore, VideoStore
+from ..uploads import UploadConflict, UploadStore
 
 
 def register(
@@ -21,9 +26,35 @@ def register(
     frame_store: FrameStore,
     dirs: dict,
     processing_service: ProcessingService,
+    upload_store: UploadStore,
 ):
     bp = Blueprint("media", __name__)
 
+    def _session_response(session, status=200):
+        body = {
+            "id": session["id"],
+            "filename": session["filename"],
+            "size": session["size"],
+            "offset": session["offset"],
+            "chunk_size": upload_store.chunk_size,
+            "complete": session["complete"],
+        }
+        if session["complete"]:
+            body.update(
+                {
+                    "name": session["name"],
+                    "url": url_for("media.serve_video", filename=session["name"]),
+                    "sha256": session["sha256"],
+                    "duplicate": session["duplicate"],
+                }
+            )
+        resp = jsonify(body)
+        resp.status_code = status
+        resp.headers["Upload-Offset"] = str(session["offset"])
+        resp.headers["Upload-Length"] = str(session["size"])
+        resp.headers["Cache-Control"] = "no-store"
+        return resp
+
     @bp.route("/videos", methods=["GET"])
     def list_videos():
         records = video_store.list_videos()
@@ -38,18 +69,35 @@ def register(
         filename = os.path.basename(filename)
         video_path = os.path.join(dirs["video"], filename)
         base, _ = os.path.splitext(filename)
-        audio_path = os.path.join(dirs["audio"], f"{base}.mp3")
+        audio_paths = [
+            os.path.join(dirs["audio"], f"{base}{suffix}")
+            for ext in ("mp3", "m4a", "ogg", "wav")
+            for suffix in (f".{ext}", f".{ext}.timemap.json")
+        ]
         subs_path = subtitle_store.path_for(filename)
+        segs_path = subtitle_store.columnar_path_for(filename)
         sugg_path = os.path.join(dirs["suggestions"], f"{filename}.json")
+        index_path = os.path.join(dirs["index"], f"{filename}.json")
         errors = []
         deleted = []
-        for path in (video_path, audio_path, subs_path, sugg_path):
+        for path in (
+            video_path,
+            *audio_paths,
+            subs_path,
+            *sidecar_paths(subs_path),
+            segs_path,
+            sugg_path,
+            *sidecar_paths(sugg_path),
+            index_path,
+        ):
             try:
                 if os.path.exists(path):
                     os.remove(path)
                     deleted.append(os.path.basename(path))
             except Exception as e:
                 errors.append(str(e))
+        if video_store.content_index is not None:
+            video_store.content_index.remove(filename)
         status = 200 if not errors else 207
         return jsonify({"deleted": deleted, "errors": errors}), status
 
@@ -61,9 +109,10 @@ def register(
         if file.filename == "":
             return jsonify({"error": "No file selected"}), 400
         try:
-            name = video_store.save(file)
+            stored = video_store.save(file)
         except ValueError as e:
             return jsonify({"error": str(e)}), 400
+        name = stored.name
         save_path = os.path.join(dirs["video"], name)
         processing_service.queue(save_path)
         return (
@@ -71,10 +120,63 @@ def register(
                 {
                     "name": name,
                     "url": url_for("media.serve_video", filename=name),
+                    "sha256": stored.sha256,
+                    "duplicate": stored.duplicate,
                 }
             ),
-            201,
+            200 if stored.duplicate else 201,
+        )
+
+    @bp.route("/upload/sessions", methods=["POST"])
+    def create_upload_session():
+        data = request.get_json(silent=True) or {}
+        filename = data.get("filename") or request.headers.get("Upload-Filename") or ""
+        size = data.get("size") or request.headers.get("Upload-Length")
+        try:
+            session = upload_store.create(filename, int(size or 0))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        resp = _session_response(session, 201)
+        resp.headers["Location"] = url_for(
+            "media.upload_session", session_id=session["id"]
         )
+        return resp
+
+    @bp.route("/upload/sessions/<session_id>", methods=["GET", "HEAD"])
+    def upload_session(session_id):
+        session = upload_store.get(session_id)
+        if session is None:
+            return jsonify({"error": "not found"}), 404
+        return _session_response(session)
+
+    @bp.route("/upload/sessions/<session_id>", methods=["PATCH", "PUT"])
+    def upload_chunk(session_id):
+        offset = request.headers.get("Upload-Offset", request.args.get("offset"))
+        try:
+            offset = int(offset)
+        except (TypeError, ValueError):
+            return jsonify({"error": "missing Upload-Offset"}), 400
+        try:
+            session = upload_store.append(session_id, offset, request.stream)
+        except KeyError:
+            return jsonify({"error": "not found"}), 404
+        except UploadConflict as e:
+            resp = jsonify({"error": str(e), "offset": e.offset})
+            resp.status_code = 409
+            resp.headers["Upload-Offset"] = str(e.offset)
+            return resp
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if not session["complete"]:
+            return _session_response(session)
+        processing_service.queue(os.path.join(dirs["video"], session["name"]))
+        return _session_response(session, 200 if session["duplicate"] else 201)
+
+    @bp.route("/upload/sessions/<session_id>", methods=["DELETE"])
+    def abort_upload_session(session_id):
+        if not upload_store.abort(session_id):
+            return jsonify({"error": "not found"}), 404
+        return ("", 204)
 
     @bp.route("/api/ensure_processed", methods=["POST"])
     def api_ensure_processed():
@@ -91,13 +193,68 @@ def register(
         video_path = video_store.path_for(name)
         if not os.path.isfile(video_path):
             return jsonify({"status": "error", "error": "not found"}), 404
-        processing_service.queue(video_path)
+        processing_service.queue(video_path, priority=PRIORITY_INTERACTIVE)
         return jsonify({"status": "queued"})
 
+    @bp.route("/api/processing/status", methods=["GET"])
+    def api_processing_status():
+        return jsonify(processing_service.status())
+
     @bp.route("/subtitles/<path:filename>.json")
     def serve_subtitles(filename):
-        segments = subtitle_store.read_segments(filename)
-        return jsonify({"segments": segments})
+        """
+        Subtitles of a lecture. Optional query parameters:
+
+        - ``from`` / ``to`` (seconds): only segments overlapping that window;
+        - ``limit``: at most this many segments per response, with
+          ``next_cursor`` to pass as ``cursor`` for the following page.
+
+        Without parameters the whole list is returned as before.
+        """
+        args = request.args
+        try:
+            start = float(args["from"]) if args.get("from") else None
+            end = float(args["to"]) if args.get("to") else None
+            limit = int(args["limit"]) if args.get("limit") else None
+            cursor = int(args["cursor"]) if args.get("cursor") else None
+        except ValueError:
+            return jsonify({"error": "invalid from/to/limit/cursor"}), 400
+        if (
+            any(v is not None and not math.isfinite(v) for v in (start, end))
+            or (limit is not None and limit <= 0)
+            or (cursor is not None and cursor < 0)
+        ):
+            return jsonify({"error": "invalid from/to/limit/cursor"}), 400
+        windowed = any(v is not None for v in (start, end, limit, cursor))
+        variant = f"{start}:{end}:{limit}:{cursor}" if windowed else ""
+
+        def build():
+            if not windowed:
+                path = subtitle_store.path_for(filename)
+                if os.path.isfile(path):
+                    return send_json_file(path)
+                return jsonify({"segments": []})
+            index = subtitle_store.segment_index(filename)
+            lo = 0
+            if start is not None:
+                lo = index.count_before(start)
+                # The segment already playing at ``from`` overlaps the window.
+                if lo > 0 and index.ends[lo - 1] > start:
+                    lo -= 1
+            hi = len(index) if end is None else index.count_before(end)
+            if cursor is not None:
+                lo = max(lo, cursor)
+            next_cursor = None
+            if limit is not None and hi - lo > limit:
+                hi = lo + limit
+                next_cursor = str(hi)
+            return jsonify(
+                {"segments": index.segments(lo, hi), "next_cursor": next_cursor}
+            )
+
+        return conditional(
+            [subtitle_store.path_for(filename)], build, variant=variant
+        )
 
     @bp.route("/frames/<path:filename>")
     def serve_frame(filename):
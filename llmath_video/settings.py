@@ -6,6 +6,7 @@ from typing import Dict
 
 from config_manager import (
     build_llm_config,
+    build_processing_config,
     ensure_data_directories,
     load_config,
 )
@@ -20,6 +21,9 @@ class DataDirectories:
     summaries: str
     logs: str
     suggestions: str
+    state: str
+    cache: str
+    index: str
 
 
 @dataclass(frozen=True)
@@ -27,6 +31,7 @@ class AppSettings:
     base_dir: str
     config: Dict
     llm_config: Dict
+    processing_config: Dict
     dirs: DataDirectories
     allowed_extensions: frozenset[str]
 
@@ -35,10 +40,26 @@ class AppSettings:
             "base_dir": self.base_dir,
             "config": self.config,
             "llm_config": self.llm_config,
+            "processing_config": self.processing_config,
             "dirs": self.dirs,
             "allowed_extensions": self.allowed_extensions,
         }
 
+    def dir_map(self) -> Dict[str, str]:
+        return {
+            "video": self.dirs.video,
+            "audio": self.dirs.audio,
+            "subtitles": self.dirs.subtitles,
+            "frames": self.dirs.frames,
+            "summaries": self.dirs.summaries,
+            "logs": self.dirs.logs,
+            "suggestions": self.dirs.suggestions,
+            "state": self.dirs.state,
+            "cache": self.dirs.cache,
+            "index": self.dirs.index,
+            "base": self.base_dir,
+        }
+
 
 def load_settings(base_dir: str) -> AppSettings:
     config = load_config(base_dir)
@@ -51,13 +72,18 @@ def load_settings(base_dir: str) -> AppSettings:
         summaries=dirs["summaries"],
         logs=dirs["logs"],
         suggestions=dirs["suggestions"],
+        state=dirs["state"],
+        cache=dirs["cache"],
+        index=dirs["index"],
     )
     llm_config = build_llm_config(config)
+    processing_config = build_processing_config(config)
     allowed_extensions = frozenset({".mp4", ".webm", ".ogg", ".mkv", ".mov"})
     return AppSettings(
         base_dir=os.path.abspath(base_dir),
         config=config,
         llm_config=llm_config,
+        processing_config=processing_config,
         dirs=data_dirs,
         allowed_extensions=allowed_extensions,
     )
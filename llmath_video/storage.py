@@ -1,16 +1,27 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
+import sqlite3
+import struct
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Sequence
+from typing import IO, Any, Callable, Dict, List, Optional, Sequence, Tuple
 import logging
 
 from flask import url_for
 from werkzeug.datastructures import FileStorage
 import base64
 
+from .compression import write_sidecars
+from .retrieval import BM25Index, SegmentIndex
+from .subtitle_format import read_columnar, write_columnar
+
 
 @dataclass(frozen=True)
 class FileRecord:
@@ -18,10 +29,159 @@ class FileRecord:
     url: str
 
 
+@dataclass(frozen=True)
+class StoredVideo:
+    name: str
+    sha256: str
+    duplicate: bool = False
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentIndex:
+    """
+    Maps video names to the SHA-256 of their bytes so identical uploads
+    resolve to one video and its already produced artifacts.
+    """
+
+    def __init__(self, path: str, video_dir: str):
+        self.path = path
+        self.video_dir = video_dir
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS videos (
+                    name TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS videos_sha256 ON videos (sha256)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def add(self, name: str, sha256: str):
+        path = os.path.join(self.video_dir, name)
+        st = os.stat(path)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO videos (name, sha256, size, mtime) VALUES (?, ?, ?, ?)",
+                (name, sha256, st.st_size, st.st_mtime),
+            )
+
+    def remove(self, name: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM videos WHERE name = ?", (name,))
+
+    def store_unique(self, sha256: str, place: Callable[[], str]) -> Tuple[str, bool]:
+        """
+        Resolve ``sha256`` to a stored video, or call ``place`` to move the
+        new upload into the video directory and index it. Returns the name
+        and whether it is a duplicate.
+
+        The check and the insert run under the database write lock, so
+        concurrent uploads of the same bytes keep one copy even when they
+        finish in different processes.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT name FROM videos WHERE sha256 = ? ORDER BY mtime", (sha256,)
+                ).fetchall()
+                for (name,) in rows:
+                    if os.path.isfile(os.path.join(self.video_dir, name)):
+                        conn.execute("COMMIT")
+                        return name, True
+                name = place()
+                st = os.stat(os.path.join(self.video_dir, name))
+                conn.execute(
+                    "INSERT OR REPLACE INTO videos (name, sha256, size, mtime) VALUES (?, ?, ?, ?)",
+                    (name, sha256, st.st_size, st.st_mtime),
+                )
+                conn.execute("COMMIT")
+                return name, False
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def hash_of(self, name: str) -> Optional[str]:
+        """
+        Return the content hash of a stored video, hashing it on first use
+        (videos uploaded before the index existed) or after it changed.
+        """
+        path = os.path.join(self.video_dir, name)
+        if not os.path.isfile(path):
+            self.remove(name)
+            return None
+        st = os.stat(path)
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT sha256, size, mtime FROM videos WHERE name = ?", (name,)
+            ).fetchone()
+        if row is not None and row[1] == st.st_size and row[2] == st.st_mtime:
+            return row[0]
+        sha256 = hash_file(path)
+        self.add(name, sha256)
+        return sha256
+
+    def names_for(self, sha256: str, size: Optional[int] = None) -> List[str]:
+        """
+        Names of existing videos with this content. When ``size`` is given,
+        not yet indexed videos of the same size are hashed first; that can
+        read whole lectures, so it belongs in background processing.
+        """
+        if size is not None:
+            with self._connect() as conn:
+                known = {r[0] for r in conn.execute("SELECT name FROM videos")}
+            for entry in os.scandir(self.video_dir):
+                if entry.name in known or not entry.is_file():
+                    continue
+                if entry.name.startswith(".") or entry.stat().st_size != size:
+                    continue
+                self.hash_of(entry.name)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT name FROM videos WHERE sha256 = ? ORDER BY mtime", (sha256,)
+            ).fetchall()
+        names = []
+        for (name,) in rows:
+            if os.path.isfile(os.path.join(self.video_dir, name)):
+                names.append(name)
+            else:
+                self.remove(name)
+        return names
+
+
 class VideoStore:
-    def __init__(self, video_dir: str, allowed_extensions: Sequence[str]):
+    def __init__(
+        self,
+        video_dir: str,
+        allowed_extensions: Sequence[str],
+        content_index: Optional[ContentIndex] = None,
+    ):
         self.video_dir = video_dir
         self.allowed_extensions = {ext.lower() for ext in allowed_extensions}
+        self.content_index = content_index
 
     def allowed_file(self, filename: str) -> bool:
         _, ext = os.path.splitext((filename or "").lower())
@@ -59,8 +219,7 @@ class VideoStore:
             safe_base = "video"
         return f"{safe_base}{ext}"
 
-    def save(self, storage: FileStorage) -> str:
-        filename = self.sanitize_name(storage.filename or "")
+    def unique_path(self, filename: str) -> str:
         save_path = os.path.join(self.video_dir, filename)
         base, ext = os.path.splitext(filename)
         counter = 1
@@ -68,8 +227,44 @@ class VideoStore:
             new_name = f"{base}_{counter}{ext}"
             save_path = os.path.join(self.video_dir, new_name)
             counter += 1
-        storage.save(save_path)
-        return os.path.basename(save_path)
+        return save_path
+
+    def save(self, storage: FileStorage) -> StoredVideo:
+        """
+        Stream an upload to disk while hashing it. An upload whose bytes
+        match an existing video is discarded and resolves to that video.
+        """
+        filename = self.sanitize_name(storage.filename or "")
+        tmp_path = os.path.join(self.video_dir, f".upload-{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        try:
+            with open(tmp_path, "wb") as out:
+                for chunk in iter(lambda: storage.stream.read(HASH_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    out.write(chunk)
+            return self.commit_upload(tmp_path, filename, digest.hexdigest())
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def commit_upload(self, tmp_path: str, filename: str, sha256: str) -> StoredVideo:
+        """
+        Move a fully written upload into place, or drop it if the same
+        content is already stored. Videos that predate the content index are
+        hashed later by processing, which then adopts their artifacts.
+        """
+
+        def place() -> str:
+            save_path = self.unique_path(filename)
+            os.replace(tmp_path, save_path)
+            return os.path.basename(save_path)
+
+        if self.content_index is None:
+            return StoredVideo(place(), sha256)
+        name, duplicate = self.content_index.store_unique(sha256, place)
+        if duplicate:
+            os.remove(tmp_path)
+        return StoredVideo(name, sha256, duplicate=duplicate)
 
     def path_for(self, name: str) -> str:
         return os.path.join(self.video_dir, os.path.basename(name))
@@ -86,72 +281,351 @@ class VideoStore:
         return deleted
 
 
+class FileCache:
+    """
+    Bounded in-memory LRU of parsed files, keyed by path.
+
+    An entry is served only while the file's (mtime, size) still match the
+    version it was loaded from, so edits on disk (another process, a manual
+    fix of subtitles) are picked up on the next read at the cost of one
+    ``stat``. The memory budget is counted in file sizes on disk; parsed
+    objects take a few times more. Cached values are shared between
+    requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 256):
+        self.max_bytes = int(max_bytes)
+        self.max_entries = int(max_entries)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_bytes: int, max_entries: int):
+        with self._lock:
+            self.max_bytes = int(max_bytes)
+            self.max_entries = int(max_entries)
+            self._evict()
+
+    @staticmethod
+    def _signature(path: str) -> Optional[tuple]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _evict(self):
+        while self._entries and (
+            self._size > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+
+    def _drop(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def get(self, path: str, load: Callable[[str], Any]) -> Any:
+        """
+        Cached ``load(path)`` for the current version of the file, or None
+        when the file does not exist.
+        """
+        signature = self._signature(path)
+        with self._lock:
+            if signature is None:
+                self._drop(path)
+                return None
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        value = load(path)
+        self.put(path, value, signature)
+        return value
+
+    def put(self, path: str, value: Any, signature: Optional[tuple] = None):
+        """
+        Remember ``value`` for the file's current version (e.g. right after
+        writing it).
+        """
+        signature = signature or self._signature(path)
+        if signature is None or self.max_bytes <= 0 or self.max_entries <= 0:
+            return
+        size = signature[1]
+        with self._lock:
+            self._drop(path)
+            if size > self.max_bytes:
+                return
+            self._entries[path] = (signature, size, value)
+            self._size += size
+            self._evict()
+
+    def invalidate(self, path: str):
+        with self._lock:
+            self._drop(path)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self._size / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+file_cache = FileCache()
+
+
+def configure_file_cache(config: Dict) -> FileCache:
+    """
+    Apply ``storage_cache_mb`` / ``storage_cache_entries`` from config.json
+    to the process-wide cache (``0`` disables it).
+    """
+    file_cache.configure(
+        int(float(config.get("storage_cache_mb", 64) or 0) * 1024 * 1024),
+        int(config.get("storage_cache_entries", 256) or 0),
+    )
+    return file_cache
+
+
+def _write_atomic(path: str, write: Callable[[IO], None]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 class SubtitleStore:
-    def __init__(self, directory: str):
+    """
+    Subtitles of each lecture as ``<name>.json`` (the export format served
+    to the browser) plus a columnar ``<name>.segs`` copy that time lookups
+    memory-map instead of parsing the JSON (see ``subtitle_format``). The
+    binary copy is written with the JSON and rebuilt from it when missing
+    or older than the JSON.
+    """
+
+    def __init__(self, directory: str, cache: Optional[FileCache] = None):
         self.directory = directory
+        self.cache = cache or file_cache
+        self.logger = logging.getLogger("llmath_video.subtitles")
+        os.makedirs(self.directory, exist_ok=True)
 
     def path_for(self, name: str) -> str:
-        os.makedirs(self.directory, exist_ok=True)
         return os.path.join(self.directory, f"{os.path.basename(name)}.json")
 
+    def columnar_path_for(self, name: str) -> str:
+        return os.path.join(self.directory, f"{os.path.basename(name)}.segs")
+
+    @staticmethod
+    def _load(path: str) -> list:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("segments") or []
+
     def read_segments(self, name: str):
-        path = self.path_for(name)
-        if os.path.isfile(path):
-            with open(path, "r", encoding="utf-8") as f:
-                return (json.load(f).get("segments") or [])
-        return []
+        return self.cache.get(self.path_for(name), self._load) or []
+
+    def _source(self, name: str) -> Optional[tuple]:
+        try:
+            st = os.stat(self.path_for(name))
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def _write_columnar(self, name: str, segments) -> Optional[SegmentIndex]:
+        source = self._source(name)
+        if source is None:
+            return None
+        path = self.columnar_path_for(name)
+        write_columnar(path, segments, source)
+        columns = read_columnar(path)
+        self.cache.put(path, columns)
+        return SegmentIndex.from_columns(columns)
 
     def write_segments(self, name: str, segments):
         path = self.path_for(name)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump({"segments": segments}, f, ensure_ascii=False)
+        _write_atomic(
+            path, lambda f: json.dump({"segments": segments}, f, ensure_ascii=False)
+        )
+        self.cache.put(path, segments)
+        write_sidecars(path)
+        self._write_columnar(name, segments)
         return path
 
+    def segment_index(self, name: str) -> SegmentIndex:
+        """
+        Time index of the lecture's segments over the memory-mapped
+        columnar file, shared between requests until the subtitles change.
+        """
+        source = self._source(name)
+        if source is None:
+            return SegmentIndex([])
+        try:
+            columns = self.cache.get(self.columnar_path_for(name), read_columnar)
+        except (OSError, ValueError, struct.error):
+            columns = None
+        if columns is not None and columns.source == source:
+            return SegmentIndex.from_columns(columns)
+        segments = self.read_segments(name)
+        try:
+            return self._write_columnar(name, segments) or SegmentIndex(segments)
+        except OSError:
+            self.logger.exception("columnar subtitles write failed: name=%s", name)
+            return SegmentIndex(segments)
+
 
 class SummaryStore:
-    def __init__(self, directory: str):
+    def __init__(self, directory: str, cache: Optional[FileCache] = None):
         self.directory = directory
+        self.cache = cache or file_cache
+        os.makedirs(self.directory, exist_ok=True)
 
     def path_for(self, name: str) -> str:
-        os.makedirs(self.directory, exist_ok=True)
         return os.path.join(self.directory, f"{os.path.basename(name)}.txt")
 
+    @staticmethod
+    def _load(path: str) -> str:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
     def read(self, name: str) -> str:
-        path = self.path_for(name)
-        if os.path.isfile(path):
-            with open(path, "r", encoding="utf-8") as f:
-                return f.read()
-        return ""
+        return self.cache.get(self.path_for(name), self._load) or ""
 
     def write(self, name: str, content: str):
         path = self.path_for(name)
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(content)
+        _write_atomic(path, lambda f: f.write(content))
+        self.cache.put(path, content)
         return path
 
 
 class SuggestionStore:
-    def __init__(self, directory: str):
+    def __init__(self, directory: str, cache: Optional[FileCache] = None):
         self.directory = directory
+        self.cache = cache or file_cache
+        os.makedirs(self.directory, exist_ok=True)
 
     def path_for(self, name: str) -> str:
-        os.makedirs(self.directory, exist_ok=True)
         return os.path.join(self.directory, f"{os.path.basename(name)}.json")
 
+    @staticmethod
+    def _load(path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
     def read(self, name: str):
-        path = self.path_for(name)
-        if os.path.isfile(path):
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return None
+        return self.cache.get(self.path_for(name), self._load)
 
     def write_items(self, name: str, items):
         path = self.path_for(name)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump({"items": items}, f, ensure_ascii=False)
+        data = {"items": items}
+        _write_atomic(path, lambda f: json.dump(data, f, ensure_ascii=False))
+        self.cache.put(path, data)
+        write_sidecars(path)
         return path
 
 
+class TranscriptIndexStore:
+    """
+    Per-lecture BM25 index over subtitle segments, ``<directory>/<name>.json``.
+
+    The file records the size and mtime of the subtitles it was built from;
+    a missing or stale index is rebuilt on first use, so lectures
+    transcribed before indexing existed are covered too. Loaded indexes are
+    kept in the shared file cache until their file changes.
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        directory: str,
+        subtitle_store: SubtitleStore,
+        cache: Optional[FileCache] = None,
+    ):
+        self.directory = directory
+        self.subtitle_store = subtitle_store
+        self.cache = cache or file_cache
+        self.logger = logging.getLogger("llmath_video.index")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.directory, f"{os.path.basename(name)}.json")
+
+    def _source_signature(self, name: str) -> Optional[list]:
+        try:
+            st = os.stat(self.subtitle_store.path_for(name))
+        except OSError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    def _load(self, path: str) -> tuple:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None, None
+        if data.get("version") != self.VERSION:
+            return None, None
+        return data.get("source"), BM25Index.from_dict(data.get("bm25") or {})
+
+    def is_fresh(self, name: str) -> bool:
+        return self.read(name) is not None
+
+    def read(self, name: str) -> Optional[BM25Index]:
+        source = self._source_signature(name)
+        if source is None:
+            return None
+        loaded = self.cache.get(self.path_for(name), self._load)
+        if not loaded or loaded[0] != source:
+            return None
+        return loaded[1]
+
+    def build(self, name: str) -> Optional[BM25Index]:
+        source = self._source_signature(name)
+        if source is None:
+            return None
+        segments = self.subtitle_store.segment_index(name)
+        index = BM25Index.build(segments.texts)
+        path = self.path_for(name)
+        data = {"version": self.VERSION, "source": source, "bm25": index.to_dict()}
+        _write_atomic(path, lambda f: json.dump(data, f, ensure_ascii=False))
+        self.cache.put(path, (source, index))
+        return index
+
+    def get(self, name: str) -> Optional[BM25Index]:
+        index = self.read(name)
+        if index is not None:
+            return index
+        try:
+            return self.build(name)
+        except OSError:
+            self.logger.exception("index build failed: name=%s", name)
+            return None
+
+    def remove(self, name: str):
+        path = self.path_for(name)
+        self.cache.invalidate(path)
+        if os.path.exists(path):
+            os.remove(path)
+
+
 class LogStore:
     def __init__(self, directory: str):
         self.directory = directory
@@ -0,0 +1,171 @@
+"""
+Columnar binary subtitles (``<name>.segs`` next to ``<name>.json``).
+
+Layout, little-endian, every section 8-byte aligned::
+
+    header   magic "LMSUBS01", count u64, source size u64,
+             source mtime_ns u64, text bytes u64
+    starts   f64[count]
+    ends     f64[count]
+    bytes    u64[count + 1]  offsets of each text in the blob
+    chars    u64[count + 1]  offsets of each text in " ".join(texts)
+    blob     UTF-8 texts, each followed by a space
+
+The file is memory-mapped and sliced in place: opening it costs a header
+read, and a lookup decodes only the texts it returns. ``source`` records
+the size and mtime of the JSON subtitles the file was built from, so an
+edited JSON export is detected and the binary rebuilt.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import sys
+import uuid
+from array import array
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+MAGIC = b"LMSUBS01"
+_HEADER = struct.Struct("<8sQQQQ")
+
+# Windows cannot delete or replace a file while it is mapped, so there the
+# file is read into memory instead (still without per-segment objects).
+USE_MMAP = os.name != "nt"
+
+
+class _TextColumn(Sequence):
+    """
+    Lazily decoded view of the text blob; ``column[i]`` decodes one text and
+    ``joined(lo, hi)`` a run of consecutive texts in a single decode.
+    """
+
+    def __init__(self, blob: memoryview, offsets: Sequence[int]):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1] - 1], "utf-8")
+
+    def joined(self, lo: int, hi: int) -> str:
+        """
+        ``" ".join(column[lo:hi])`` straight from the blob.
+        """
+        if lo >= hi:
+            return ""
+        return str(self._blob[self._offsets[lo]:self._offsets[hi] - 1], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+class ColumnarSegments:
+    """
+    Read-only columns of one subtitles file: ``starts``, ``ends`` (float
+    sequences), ``texts`` (decoded on access) and ``char_offsets``.
+    """
+
+    def __init__(self, buffer, source: Optional[Tuple[int, int]] = None):
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, count, src_size, src_mtime, text_bytes = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError("not a columnar subtitles file")
+        pos = _HEADER.size
+
+        def column(code: str, length: int):
+            nonlocal pos
+            size = length * 8
+            chunk = view[pos:pos + size]
+            pos += size
+            if sys.byteorder == "little":
+                return chunk.cast(code)
+            values = array(code, chunk.tobytes())
+            values.byteswap()
+            return values
+
+        self.count = count
+        self.source = (src_size, src_mtime)
+        self.starts = column("d", count)
+        self.ends = column("d", count)
+        self.byte_offsets = column("Q", count + 1)
+        self.char_offsets = column("Q", count + 1)
+        self.texts = _TextColumn(view[pos:pos + text_bytes], self.byte_offsets)
+        self.stale = source is not None and tuple(source) != self.source
+
+    def __len__(self) -> int:
+        return self.count
+
+    def segments(self) -> List[dict]:
+        """
+        Plain segment dicts, as in the JSON export.
+        """
+        return [
+            {"start": self.starts[i], "end": self.ends[i], "text": self.texts[i]}
+            for i in range(self.count)
+        ]
+
+
+def write_columnar(path: str, segments: Sequence[dict], source: Tuple[int, int]):
+    """
+    Write ``segments`` to ``path`` atomically, ordered by start time.
+    """
+    items = []
+    for seg in segments or []:
+        seg = seg or {}
+        try:
+            start = float(seg.get("start", 0) or 0)
+            end = float(seg.get("end", 0) or 0)
+        except (TypeError, ValueError):
+            start = end = 0.0
+        items.append((start, end, str(seg.get("text", "") or "")))
+    if any(items[i][0] > items[i + 1][0] for i in range(len(items) - 1)):
+        items.sort(key=lambda item: item[0])
+    starts = array("d")
+    ends = array("d")
+    byte_offsets = array("Q", [0])
+    char_offsets = array("Q", [0])
+    blob = bytearray()
+    for start, end, text in items:
+        starts.append(start)
+        ends.append(end)
+        blob += text.encode("utf-8")
+        blob += b" "
+        byte_offsets.append(len(blob))
+        char_offsets.append(char_offsets[-1] + len(text) + 1)
+    if sys.byteorder != "little":
+        for values in (starts, ends, byte_offsets, char_offsets):
+            values.byteswap()
+    header = _HEADER.pack(MAGIC, len(starts), int(source[0]), int(source[1]), len(blob))
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            for values in (starts, ends, byte_offsets, char_offsets):
+                f.write(values.tobytes())
+            f.write(blob)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_columnar(path: str, source: Optional[Tuple[int, int]] = None) -> ColumnarSegments:
+    with open(path, "rb") as f:
+        if USE_MMAP and os.fstat(f.fileno()).st_size > 0:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = f.read()
+    return ColumnarSegments(buffer, source)
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import IO, Dict, Optional, Tuple
+
+from .storage import HASH_CHUNK_SIZE, StoredVideo, VideoStore
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_SESSION_TTL = 24 * 3600.0
+WRITER_LEASE_SECONDS = 120.0
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    offset INTEGER NOT NULL DEFAULT 0,
+    writer TEXT,
+    writer_expires REAL,
+    name TEXT,
+    sha256 TEXT,
+    duplicate INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class UploadConflict(Exception):
+    """
+    The client's offset does not match the session, or another request is
+    writing to it. ``offset`` is where the client should resume.
+    """
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadStore:
+    """
+    Resumable uploads written in offset-addressed chunks.
+
+    Bytes go straight into ``data/video/.upload-<id>.part`` and are hashed as
+    they arrive; the finished file is renamed into place by
+    ``VideoStore.commit_upload``, so a lecture is written to disk once.
+    Session state lives in SQLite and is shared by all web processes: a chunk
+    may land on any of them, and an interrupted chunk keeps the bytes that
+    were received before the connection dropped.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        video_store: VideoStore,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        session_ttl: float = DEFAULT_SESSION_TTL,
+    ):
+        self.path = path
+        self.video_store = video_store
+        self.chunk_size = max(HASH_CHUNK_SIZE, int(chunk_size))
+        self.session_ttl = float(session_ttl)
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Running digests for sessions this process has written to, keyed by
+        # session id as (hashed bytes, hasher). Another process catches up by
+        # hashing the part file from where its own digest stopped.
+        self._hashers: Dict[str, Tuple[int, "hashlib._Hash"]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def part_path(self, session_id: str) -> str:
+        return os.path.join(self.video_store.video_dir, f".upload-{session_id}.part")
+
+    def create(self, filename: str, size: int) -> Dict:
+        filename = self.video_store.sanitize_name(filename)
+        size = int(size)
+        if size <= 0:
+            raise ValueError("Пустой файл")
+        self.expire()
+        session_id = uuid.uuid4().hex
+        open(self.part_path(session_id), "wb").close()
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO uploads (id, filename, size, offset, created_at, updated_at)
+                VALUES (?, ?, ?, 0, ?, ?)
+                """,
+                (session_id, filename, size, now, now),
+            )
+        return self.get(session_id)
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        if not _SESSION_ID.match(session_id or ""):
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM uploads WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        session = dict(row)
+        session["duplicate"] = bool(session["duplicate"])
+        session["complete"] = session["name"] is not None
+        session.pop("writer", None)
+        session.pop("writer_expires", None)
+        return session
+
+    def _acquire(self, session_id: str, offset: int) -> Dict:
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                """
+                UPDATE uploads SET writer = ?, writer_expires = ?, updated_at = ?
+                WHERE id = ? AND offset = ? AND name IS NULL
+                  AND (writer IS NULL OR writer_expires < ?)
+                """,
+                (self.owner, now + WRITER_LEASE_SECONDS, now, session_id, offset, now),
+            )
+            acquired = cur.rowcount == 1
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        if acquired:
+            return session
+        if session["complete"]:
+            raise UploadConflict("upload already complete", session["offset"])
+        if session["offset"] != offset:
+            raise UploadConflict("offset mismatch", session["offset"])
+        raise UploadConflict("upload is being written by another request", offset)
+
+    def _release(self, session_id: str, offset: int, stored: Optional[StoredVideo] = None):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE uploads SET offset = ?, writer = NULL, writer_expires = NULL,
+                                   name = ?, sha256 = ?, duplicate = ?, updated_at = ?
+                WHERE id = ? AND writer = ?
+                """,
+                (
+                    offset,
+                    stored.name if stored else None,
+                    stored.sha256 if stored else None,
+                    int(bool(stored and stored.duplicate)),
+                    time.time(),
+                    session_id,
+                    self.owner,
+                ),
+            )
+
+    def _renew(self, session_id: str):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE uploads SET writer_expires = ? WHERE id = ? AND writer = ?",
+                (now + WRITER_LEASE_SECONDS, session_id, self.owner),
+            )
+
+    def _hasher(self, session_id: str, offset: int):
+        with self._lock:
+            hashed, digest = self._hashers.pop(session_id, (0, None))
+        if digest is None or hashed > offset:
+            hashed, digest = 0, hashlib.sha256()
+        if hashed < offset:
+            with open(self.part_path(session_id), "rb") as f:
+                f.seek(hashed)
+                remaining = offset - hashed
+                while remaining > 0:
+                    chunk = f.read(min(HASH_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    remaining -= len(chunk)
+        return digest
+
+    def append(self, session_id: str, offset: int, stream: IO[bytes]) -> Dict:
+        """
+        Write ``stream`` at ``offset``. Returns the updated session; when the
+        last byte arrives the session carries the stored video ``name``.
+        """
+        session = self._acquire(session_id, int(offset))
+        offset = session["offset"]
+        remaining = session["size"] - offset
+        digest = None
+        written = 0
+        stored = None
+        try:
+            digest = self._hasher(session_id, offset)
+            renewed = time.monotonic()
+            with open(self.part_path(session_id), "r+b") as out:
+                # Drop bytes a crashed writer left past the committed offset.
+                out.truncate(offset)
+                out.seek(offset)
+                while written < remaining:
+                    chunk = stream.read(min(HASH_CHUNK_SIZE, remaining - written))
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    digest.update(chunk)
+                    written += len(chunk)
+                    if time.monotonic() - renewed > WRITER_LEASE_SECONDS / 4:
+                        self._renew(session_id)
+                        renewed = time.monotonic()
+            if written == remaining:
+                stored = self.video_store.commit_upload(
+                    self.part_path(session_id),
+                    session["filename"],
+                    digest.hexdigest(),
+                )
+        finally:
+            if digest is not None and stored is None:
+                with self._lock:
+                    self._hashers[session_id] = (offset + written, digest)
+            else:
+                with self._lock:
+                    self._hashers.pop(session_id, None)
+            self._release(session_id, offset + written, stored)
+        return self.get(session_id)
+
+    def abort(self, session_id: str) -> bool:
+        session = self.get(session_id)
+        if session is None:
+            return False
+        with self._connect() as conn:
+            conn.execute("DELETE FROM uploads WHERE id = ?", (session_id,))
+        with self._lock:
+            self._hashers.pop(session_id, None)
+        if not session["complete"] and os.path.exists(self.part_path(session_id)):
+            os.remove(self.part_path(session_id))
+        return True
+
+    def expire(self) -> int:
+        """
+        Forget sessions untouched for ``session_ttl`` seconds and delete
+        their partial files.
+        """
+        cutoff = time.time() - self.session_ttl
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT id FROM uploads
+                WHERE updated_at < ? AND (writer IS NULL OR writer_expires < ?)
+                """,
+                (cutoff, time.time()),
+            ).fetchall()
+        expired = 0
+        for row in rows:
+            if self.abort(row["id"]):
+                expired += 1
+        return expired
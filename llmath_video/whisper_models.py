@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional
+
+from config_manager import get_llm_setting
+
+from .audio import is_pcm_wav, load_pcm_float
+
+try:
+    import whisper
+except Exception:
+    whisper = None
+
+
+class _Entry:
+    __slots__ = ("model", "lock", "size_bytes", "users", "loaded_at")
+
+    def __init__(self, model, size_bytes: int):
+        self.model = model
+        self.lock = threading.Lock()
+        self.size_bytes = size_bytes
+        self.users = 0
+        self.loaded_at = time.time()
+
+
+def _model_size_bytes(model) -> int:
+    try:
+        return int(sum(p.numel() * p.element_size() for p in model.parameters()))
+    except Exception:
+        return 0
+
+
+class WhisperModelRegistry:
+    """
+    Process-wide cache of loaded whisper models keyed by model name.
+
+    ``acquire`` hands out a model under its own lock: whisper installs
+    decoding hooks on the model during ``transcribe``, so one model serves
+    one transcription at a time while other models stay usable. Idle models
+    are evicted least-recently-used first when the count or memory budget
+    is exceeded.
+    """
+
+    def __init__(
+        self,
+        max_models: int = 1,
+        memory_budget_mb: float = 0.0,
+        loader: Optional[Callable[[str], object]] = None,
+    ):
+        self.max_models = max(1, int(max_models))
+        self.memory_budget_bytes = int(max(0.0, memory_budget_mb) * 1024 * 1024)
+        self._loader = loader
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger("llmath_video.whisper_models")
+
+    def configure(self, max_models: int, memory_budget_mb: float):
+        with self._lock:
+            self.max_models = max(1, int(max_models))
+            self.memory_budget_bytes = int(max(0.0, memory_budget_mb) * 1024 * 1024)
+            self._evict_locked(keep=None)
+
+    def _load(self, name: str):
+        if self._loader is not None:
+            return self._loader(name)
+        if whisper is None:
+            raise RuntimeError("openai-whisper package is not installed")
+        return whisper.load_model(name)
+
+    def _get_or_load(self, name: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+                entry.users += 1
+                self.hits += 1
+                return entry
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is not None:
+                    self._entries.move_to_end(name)
+                    entry.users += 1
+                    self.hits += 1
+                    return entry
+            started = time.monotonic()
+            model = self._load(name)
+            entry = _Entry(model, _model_size_bytes(model))
+            self.logger.info(
+                "whisper model loaded: name=%s size_mb=%.1f seconds=%.1f",
+                name,
+                entry.size_bytes / (1024 * 1024),
+                time.monotonic() - started,
+            )
+            with self._lock:
+                entry.users += 1
+                self.misses += 1
+                self._entries[name] = entry
+                self._evict_locked(keep=name)
+            return entry
+
+    def _evict_locked(self, keep: Optional[str]):
+        def over_budget() -> bool:
+            if len(self._entries) > self.max_models:
+                return True
+            if self.memory_budget_bytes:
+                total = sum(e.size_bytes for e in self._entries.values())
+                return total > self.memory_budget_bytes
+            return False
+
+        for name in list(self._entries.keys()):
+            if not over_budget():
+                break
+            entry = self._entries[name]
+            if name == keep or entry.users > 0:
+                continue
+            del self._entries[name]
+            self.logger.info("whisper model evicted: name=%s", name)
+
+    @contextmanager
+    def acquire(self, name: str):
+        entry = self._get_or_load(name)
+        try:
+            with entry.lock:
+                yield entry.model
+        finally:
+            with self._lock:
+                entry.users -= 1
+                self._evict_locked(keep=None)
+
+    def warm_up(self, names: Iterable[str]):
+        for name in names:
+            with self.acquire(name):
+                pass
+
+    def evict(self, name: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.users > 0:
+                return False
+            del self._entries[name]
+            return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "models": {
+                    name: {
+                        "size_mb": round(e.size_bytes / (1024 * 1024), 1),
+                        "in_use": e.users,
+                    }
+                    for name, e in self._entries.items()
+                },
+                "hits": self.hits,
+                "misses": self.misses,
+                "max_models": self.max_models,
+                "memory_budget_mb": self.memory_budget_bytes / (1024 * 1024),
+            }
+
+
+whisper_models = WhisperModelRegistry()
+
+
+def configure_whisper_models(llm_config: Dict, warm_up: Optional[bool] = None):
+    """
+    Apply cache limits from ``llm_config`` and optionally preload the
+    configured local model in the background.
+    """
+    try:
+        max_models = int(get_llm_setting(llm_config, "whisper_cache_models"))
+    except ValueError:
+        max_models = 1
+    try:
+        budget_mb = float(get_llm_setting(llm_config, "whisper_cache_memory_mb"))
+    except ValueError:
+        budget_mb = 0.0
+    whisper_models.configure(max_models, budget_mb)
+
+    mode = (get_llm_setting(llm_config, "stt_mode") or "api").strip().lower()
+    if warm_up is None:
+        flag = get_llm_setting(llm_config, "whisper_warmup").strip().lower()
+        warm_up = flag in {"1", "true", "yes", "on"}
+    if mode != "local" or not warm_up or whisper is None:
+        return None
+    model_name = get_llm_setting(llm_config, "whisper_local_model") or "base"
+
+    def _warm():
+        try:
+            whisper_models.warm_up([model_name])
+        except Exception:
+            whisper_models.logger.exception("whisper warm-up failed: name=%s", model_name)
+
+    thread = threading.Thread(target=_warm, name="whisper-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def _int_setting(llm_config: Dict, key: str, default: int = 0) -> int:
+    try:
+        return int(float(get_llm_setting(llm_config, key)))
+    except ValueError:
+        return default
+
+
+def run_whisper(audio, model_name: str, language: Optional[str]) -> Dict:
+    """
+    Transcribe ``audio`` (path or float32 array) with a cached model and
+    return only the picklable parts of the whisper result. PCM WAV artifacts
+    are read from a memory map instead of going through whisper's ffmpeg
+    subprocess.
+    """
+    if is_pcm_wav(audio):
+        audio = load_pcm_float(audio)
+    with whisper_models.acquire(model_name) as model:
+        result = model.transcribe(audio, language=language)
+    return {
+        "text": result.get("text") or "",
+        "segments": [
+            {
+                "start": seg.get("start", 0.0),
+                "end": seg.get("end", 0.0),
+                "text": seg.get("text") or "",
+            }
+            for seg in (result.get("segments") or [])
+        ],
+    }
+
+
+def _init_pool_worker(threads: int, max_models: int, budget_mb: float):
+    if threads > 0:
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[var] = str(threads)
+        try:
+            import torch
+
+            torch.set_num_threads(threads)
+            torch.set_num_interop_threads(1)
+        except Exception:
+            pass
+    whisper_models.configure(max_models, budget_mb)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def get_transcription_pool(llm_config: Dict) -> Optional[ProcessPoolExecutor]:
+    """
+    Return the shared process pool for local STT, or None when
+    ``whisper_processes`` is 0 and whisper should run in-process.
+
+    Every pool process keeps its own model cache, and torch inside it is
+    limited to ``whisper_threads_per_process`` threads (by default the CPU
+    count split evenly between processes).
+    """
+    global _pool, _pool_size
+    processes = _int_setting(llm_config, "whisper_processes")
+    if processes <= 0:
+        return None
+    with _pool_lock:
+        if _pool is not None and _pool_size == processes:
+            return _pool
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        threads = _int_setting(llm_config, "whisper_threads_per_process")
+        if threads <= 0:
+            threads = max(1, (os.cpu_count() or 1) // processes)
+        _pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_pool_worker,
+            initargs=(
+                threads,
+                _int_setting(llm_config, "whisper_cache_models", 1),
+                float(_int_setting(llm_config, "whisper_cache_memory_mb")),
+            ),
+        )
+        _pool_size = processes
+        return _pool
+
+
+def transcription_parallelism(llm_config: Dict) -> int:
+    """
+    How many local transcriptions can usefully run at once.
+    """
+    return max(1, _int_setting(llm_config, "whisper_processes"))
@@ -0,0 +1,105 @@
+"""
+Standalone processing worker.
+
+Consumes jobs from the shared job table (``data/state/jobs.sqlite3``) so the
+web tier can run with ``processing.mode = "external"`` and only enqueue::
+
+    python -m llmath_video.worker --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import signal
+import threading
+from typing import Optional, Sequence
+
+from config_manager import get_processing_setting
+
+from .jobs import JobStore
+from .llm_cache import configure_response_cache
+from .rate_limit import configure_rate_limiter
+from .logging_setup import setup_logging
+from .processing import ProcessingService
+from .settings import load_settings
+from .storage import ContentIndex, LogStore, SummaryStore, configure_file_cache
+from .whisper_models import configure_whisper_models
+
+DEFAULT_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_worker(base_dir: str, workers: Optional[int] = None) -> ProcessingService:
+    settings = load_settings(base_dir)
+    setup_logging(settings.dirs.logs, level="INFO")
+    processing_config = dict(settings.processing_config)
+    if workers:
+        processing_config["workers"] = workers
+    configure_response_cache(
+        settings.llm_config, os.path.join(settings.dirs.cache, "llm")
+    )
+    configure_rate_limiter(settings.llm_config)
+    configure_file_cache(settings.config)
+    job_store = JobStore(
+        os.path.join(settings.dirs.state, "jobs.sqlite3"),
+        max_attempts=get_processing_setting(processing_config, "max_attempts"),
+    )
+    return ProcessingService(
+        settings.llm_config,
+        settings.config,
+        settings.dir_map(),
+        LogStore(settings.dirs.logs),
+        SummaryStore(settings.dirs.summaries),
+        processing_config,
+        job_store,
+        ContentIndex(
+            os.path.join(settings.dirs.state, "content.sqlite3"), settings.dirs.video
+        ),
+    )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="LLMath-Video processing worker")
+    parser.add_argument(
+        "--base-dir",
+        default=os.environ.get("VIDEOAPP_BASE_DIR", DEFAULT_BASE_DIR),
+        help="project directory containing config.json and data/",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of videos processed concurrently (overrides processing.workers)",
+    )
+    parser.add_argument(
+        "--shutdown-timeout",
+        type=float,
+        default=30.0,
+        help="seconds to wait for running jobs on SIGTERM/SIGINT",
+    )
+    args = parser.parse_args(argv)
+
+    service = create_worker(os.path.abspath(args.base_dir), args.workers)
+    logger = logging.getLogger("llmath_video.worker")
+    stop = threading.Event()
+
+    def _request_stop(signum, frame):
+        logger.info("worker: received signal %s, shutting down", signum)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    configure_whisper_models(service.llm_config)
+    service.start()
+    logger.info("worker: started owner=%s", service.owner)
+    while not stop.wait(1.0):
+        pass
+    if not service.stop(timeout=args.shutdown_timeout):
+        logger.warning("worker: jobs still running, their leases will expire")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -283,7 +283,47 @@ document.addEventListener('DOMContentLoaded', function () {
   }
 
   // Upload via DnD
-  async function uploadFile(file){ showProcessing(true); setProcessingStep('extract'); const fd=new FormData(); fd.append('file', file); try { setTimeout(()=>setProcessingStep('transcribe'), 800); const r=await fetch('/upload',{method:'POST', body:fd}); const d=await r.json(); if(!r.ok) throw new Error(d.error||'Ошибка загрузки'); setProcessingStep('summarize'); loadVideo(d.url, d.name); fetchVideos(); } catch(e){ alert(e.message||'Произошла ошибка при загрузке'); } finally { setTimeout(()=>showProcessing(false), 600); } }
+  // Resumable chunked upload: the session id is kept in localStorage so a
+  // dropped connection or a page reload continues from the server offset.
+  async function uploadChunked(file){
+    const key = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    let session = null;
+    const savedId = localStorage.getItem(key);
+    if (savedId) {
+      try { const r = await fetch(`/upload/sessions/${savedId}`); if (r.ok) session = await r.json(); } catch {}
+    }
+    if (!session || session.complete) {
+      const r = await fetch('/upload/sessions', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ filename: file.name, size: file.size }) });
+      session = await r.json();
+      if (!r.ok) throw new Error(session.error || 'Ошибка загрузки');
+      localStorage.setItem(key, session.id);
+    }
+    let failures = 0;
+    while (!session.complete) {
+      const end = Math.min(session.offset + session.chunk_size, file.size);
+      try {
+        const r = await fetch(`/upload/sessions/${session.id}`, { method: 'PATCH', headers: { 'Upload-Offset': String(session.offset), 'Content-Type': 'application/offset+octet-stream' }, body: file.slice(session.offset, end) });
+        const d = await r.json();
+        if (r.ok) { session = Object.assign(session, d); failures = 0; continue; }
+        if (r.status === 409 && typeof d.offset === 'number') {
+          // Offset mismatch, another writer, or the upload already finished:
+          // re-read the session so a completed upload ends the loop.
+          const g = await fetch(`/upload/sessions/${session.id}`);
+          if (g.ok) session = Object.assign(session, await g.json()); else session.offset = d.offset;
+          if (!session.complete) await new Promise(res => setTimeout(res, 1000));
+          continue;
+        }
+        throw new Error(d.error || 'Ошибка загрузки');
+      } catch (e) {
+        if (++failures > 5) throw e;
+        await new Promise(res => setTimeout(res, 1000 * failures));
+        try { const r = await fetch(`/upload/sessions/${session.id}`); if (r.ok) session = Object.assign(session, await r.json()); } catch {}
+      }
+    }
+    localStorage.removeItem(key);
+    return session;
+  }
+  async function uploadFile(file){ showProcessing(true); setProcessingStep('extract'); try { setTimeout(()=>setProcessingStep('transcribe'), 800); const d=await uploadChunked(file); setProcessingStep('summarize'); loadVideo(d.url, d.name); fetchVideos(); } catch(e){ alert(e.message||'Произошла ошибка при загрузке'); } finally { setTimeout(()=>showProcessing(false), 600); } }
   ['dragenter','dragover'].forEach(ev=> mainPanel.addEventListener(ev, e=>{ e.preventDefault(); e.stopPropagation(); if (dropLayer.style.display!=='none') dropLayer.classList.add('active'); }));
   ['dragleave','dragend','drop'].forEach(ev=> mainPanel.addEventListener(ev, e=>{ e.preventDefault(); e.stopPropagation(); dropLayer.classList.remove('active'); }));
   mainPanel.addEventListener('drop', e=>{ e.preventDefault(); e.stopPropagation(); const f=e.dataTransfer?.files; if(f && f.length>0) uploadFile(f[0]); });
@@ -380,7 +420,32 @@ document.addEventListener('DOMContentLoaded', function () {
   chatInput?.addEventListener('keydown', (e)=>{ if(e.key==='Enter') sendChat(); });
   function appendMsg(role, text){ dialog.push({ role, text }); const wrap=document.createElement('div'); wrap.className='msg '+(role==='student'?'msg-student':'msg-lecturer'); const content=document.createElement('div'); content.style.whiteSpace='pre-wrap'; if(role==='lecturer') content.innerHTML = mdToHtml(text||''); else content.textContent = text||''; wrap.appendChild(content); chatMessages.appendChild(wrap); chatMessages.scrollTop = chatMessages.scrollHeight; if(role==='lecturer' && window.MathJax && window.MathJax.typesetPromise){ window.MathJax.typesetPromise([wrap]).catch(()=>{}); } return wrap; }
   function appendLoader(role){ const wrap=document.createElement("div"); wrap.className='msg '+(role==='student'?'msg-student':'msg-lecturer'); const content=document.createElement("div"); content.innerHTML = '<span class="typing-loader" aria-label="loading"><span></span><span></span><span></span></span>'; wrap.appendChild(content); chatMessages.appendChild(wrap); chatMessages.scrollTop = chatMessages.scrollHeight; return {wrap, content}; }
-  async function sendChat(textOverride){ const text=((typeof textOverride==='string' && textOverride.length)? textOverride : (chatInput.value||'')).trim(); if(!text||!currentVideoName) return; if(isBusy) return; appendMsg("student", text); if (!textOverride) chatInput.value=""; const {wrap, content}=appendLoader("lecturer"); isBusy = true; try{ chatInput.disabled = true; chatSend.disabled = true; if (explainBtn) explainBtn.disabled = true; }catch{} try { const body={ name: currentVideoName, currentTime: videoElement.currentTime||0, dialog, question: text }; const r=await fetch('/api/chat',{method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(body)}); if(!r.ok) throw new Error('Сервер вернул ошибку'); const d=await r.json(); const ans=(d&&d.answer)? d.answer : 'Нет ответа'; content.innerHTML = mdToHtml(ans); if (/ошибка/i.test(ans)) content.style.color='crimson'; if(window.MathJax&&window.MathJax.typesetPromise) window.MathJax.typesetPromise([wrap]).catch(()=>{}); } catch(e){ content.textContent = (e&&e.message)? e.message : 'Ошибка обращения к LLM'; content.style.color='crimson'; } finally { isBusy = false; try{ chatInput.disabled = false; chatSend.disabled = false; if (explainBtn) explainBtn.disabled = false; }catch{} } }
+  // POST a request to a server-sent-events endpoint and report the answer as
+  // it grows; resolves with the final "done" payload.
+  async function streamAnswer(url, body, onPartial){
+    const r = await fetch(url, { method: 'POST', headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' }, body: JSON.stringify(body) });
+    if (!r.ok || !r.body) throw new Error('Сервер вернул ошибку');
+    const reader = r.body.getReader(); const decoder = new TextDecoder();
+    let buffer = ''; let text = ''; let result = null;
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let idx;
+      while ((idx = buffer.indexOf('\n\n')) >= 0) {
+        const raw = buffer.slice(0, idx); buffer = buffer.slice(idx + 2);
+        let event = 'message'; const data = [];
+        raw.split('\n').forEach(line => { if (line.startsWith('event:')) event = line.slice(6).trim(); else if (line.startsWith('data:')) data.push(line.slice(5).trim()); });
+        if (!data.length) continue;
+        let payload = {}; try { payload = JSON.parse(data.join('\n')); } catch {}
+        if (event === 'delta') { text += payload.text || ''; if (onPartial) onPartial(text); }
+        else if (event === 'done') result = payload;
+        else if (event === 'error') throw new Error(payload.error || 'Ошибка обращения к LLM');
+      }
+    }
+    return result || { answer: text };
+  }
+  async function sendChat(textOverride){ const text=((typeof textOverride==='string' && textOverride.length)? textOverride : (chatInput.value||'')).trim(); if(!text||!currentVideoName) return; if(isBusy) return; appendMsg("student", text); if (!textOverride) chatInput.value=""; const {wrap, content}=appendLoader("lecturer"); isBusy = true; try{ chatInput.disabled = true; chatSend.disabled = true; if (explainBtn) explainBtn.disabled = true; }catch{} try { const body={ name: currentVideoName, currentTime: videoElement.currentTime||0, dialog, question: text }; const d=await streamAnswer('/api/chat/stream', body, (partial)=>{ content.textContent = partial; chatMessages.scrollTop = chatMessages.scrollHeight; }); const ans=(d&&d.answer)? d.answer : 'Нет ответа'; content.innerHTML = mdToHtml(ans); if (/ошибка/i.test(ans)) content.style.color='crimson'; if(window.MathJax&&window.MathJax.typesetPromise) window.MathJax.typesetPromise([wrap]).catch(()=>{}); } catch(e){ content.textContent = (e&&e.message)? e.message : 'Ошибка обращения к LLM'; content.style.color='crimson'; } finally { isBusy = false; try{ chatInput.disabled = false; chatSend.disabled = false; if (explainBtn) explainBtn.disabled = false; }catch{} } }
   // Summary & Log
   async function loadSummary(){ if(!currentVideoName) return; const el=document.getElementById('about-content'); let attempts=0; const pull = async ()=>{ try{ const r=await fetch(`/summary/${encodeURIComponent(currentVideoName)}`); if(!r.ok) return; const d=await r.json(); const txt=(d&&d.text)? d.text : ''; if (el) { el.innerHTML = txt ? mdToHtml(txt) : 'Описание пока не готово'; if(window.MathJax&&window.MathJax.typesetPromise) window.MathJax.typesetPromise([el]).catch(()=>{}); } if(!txt && attempts<6){ attempts++; setTimeout(pull, 5000); } } catch{} }; pull(); }
   async function loadLog(){ if(!currentVideoName) return; try{ const r=await fetch(`/logs/${encodeURIComponent(currentVideoName)}`); if(!r.ok) return; const d=await r.json(); const el=document.getElementById('log-content'); if(!el) return; const entries=d?.entries||[]; el.innerHTML=''; entries.forEach(e=>{ const block=document.createElement('div'); block.style.margin='8px 0'; const head=document.createElement('div'); head.style.fontWeight='600'; head.textContent=`${e.time} | ${e.type}`; const body=document.createElement('div'); body.style.whiteSpace='pre-wrap'; body.textContent=e.content||''; block.appendChild(head); block.appendChild(body); if(e.image_url){ const img=document.createElement('img'); img.src=e.image_url; img.alt='кадр'; img.style.maxWidth='100%'; img.style.borderRadius='6px'; img.style.marginTop='6px'; block.appendChild(img);} el.appendChild(block); }); if(!entries.length) el.textContent='Пусто'; } catch{} }
@@ -424,7 +489,7 @@ document.addEventListener('DOMContentLoaded', function () {
       if (wrap){ wrap.dataset.kind='frame'; wrap.dataset.normx=String(lastClickRel.x); wrap.dataset.normy=String(lastClickRel.y); }
       // lock UI while waiting
       isBusy = true; try{ chatInput.disabled = true; chatSend.disabled = true; if (newBtn) newBtn.disabled = true; }catch{}
-      try { const r=await fetch('/api/explain_frame',{method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ name: currentVideoName, currentTime: videoElement.currentTime||0, image: shot.dataUrl })}); if(!r.ok) throw new Error('Сервер вернул ошибку при анализе кадра'); const d=await r.json(); const ans=(d&&d.answer)? d.answer : 'Нет ответа'; content.innerHTML = mdToHtml(ans); if (/ошибка/i.test(ans)) content.style.color='crimson'; if(window.MathJax&&window.MathJax.typesetPromise) window.MathJax.typesetPromise([wrap]).catch(()=>{}); showAnnotationPopover(ans, lastClickRel); } catch(e){ content.textContent = (e&&e.message)? e.message : 'Ошибка обращения к LLM (кадр)'; content.style.color='crimson'; }
+      try { const d=await streamAnswer('/api/explain_frame/stream', { name: currentVideoName, currentTime: videoElement.currentTime||0, image: shot.dataUrl }, (partial)=>{ content.textContent = partial; chatMessages.scrollTop = chatMessages.scrollHeight; }); const ans=(d&&d.answer)? d.answer : 'Нет ответа'; content.innerHTML = mdToHtml(ans); if (/ошибка/i.test(ans)) content.style.color='crimson'; if(window.MathJax&&window.MathJax.typesetPromise) window.MathJax.typesetPromise([wrap]).catch(()=>{}); showAnnotationPopover(ans, lastClickRel); } catch(e){ content.textContent = (e&&e.message)? e.message : 'Ошибка обращения к LLM (кадр)'; content.style.color='crimson'; }
       finally { isBusy = false; try{ chatInput.disabled = false; chatSend.disabled = false; if (newBtn) newBtn.disabled = false; }catch{} }
     });
   }
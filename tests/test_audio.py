@@ -0,0 +1,19 @@
+import numpy as np
+
+from llmath_video.audio import SAMPLE_RATE, SilenceCompressor
+
+
+def test_long_silence_is_not_buffered_whole():
+    vad = SilenceCompressor(min_silence=2.0, keep_silence=0.5)
+    speech = np.random.default_rng(0).normal(0, 8000, SAMPLE_RATE).astype(np.int16)
+    out = [vad.feed(speech)]
+    for _ in range(600):
+        out.append(vad.feed(np.zeros(SAMPLE_RATE, dtype=np.int16)))
+        buffered = sum(part.size for part in vad._silence)
+        assert buffered <= vad.min_silence + SAMPLE_RATE
+    out.append(vad.feed(speech))
+    out.append(vad.flush())
+    total = sum(part.size for part in out)
+    # Frame alignment may shift a run boundary by one frame.
+    assert abs(total - (2 * SAMPLE_RATE + 2 * vad.keep_half)) <= vad.frame
+    assert vad.removed_seconds > 599
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from config_manager import DATA_SUBDIRS
+from llmath_video.processing import ProcessingService
+from llmath_video.storage import LogStore, SummaryStore
+
+
+def make_service(tmp_path, stt_mode):
+    dirs = {"base": str(tmp_path)}
+    for key in DATA_SUBDIRS:
+        dirs[key] = str(tmp_path / key)
+        os.makedirs(dirs[key], exist_ok=True)
+    return ProcessingService(
+        {"stt_mode": stt_mode},
+        {},
+        dirs,
+        LogStore(dirs["logs"]),
+        SummaryStore(dirs["summaries"]),
+    )
+
+
+@pytest.mark.parametrize("stt_mode, preferred", [("local", "wav"), ("api", "mp3")])
+def test_audio_path_prefers_mode_format(tmp_path, stt_mode, preferred):
+    service = make_service(tmp_path, stt_mode)
+    assert service._audio_path("x.mp4") == str(tmp_path / "audio" / f"x.{preferred}")
+
+
+@pytest.mark.parametrize(
+    "stt_mode, existing", [("local", "mp3"), ("api", "wav")]
+)
+def test_audio_path_finds_audio_from_other_mode(tmp_path, stt_mode, existing):
+    service = make_service(tmp_path, stt_mode)
+    path = tmp_path / "audio" / f"x.{existing}"
+    path.write_bytes(b"")
+    assert service._audio_path("x.mp4") == str(path)
+
+
+def test_stop_ends_heartbeat_and_restart_spawns_one(tmp_path):
+    service = make_service(tmp_path, "api")
+    service.start()
+    first = service._heartbeat
+    assert service.stop(timeout=5)
+    assert not first.is_alive()
+    service.start()
+    assert service._heartbeat is not first and service._heartbeat.is_alive()
+    assert service.stop(timeout=5)
+    assert not service._heartbeat.is_alive()
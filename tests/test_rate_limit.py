@@ -0,0 +1,31 @@
+import threading
+import time
+
+from llmath_video.rate_limit import PRIORITY_BACKGROUND, RateLimiter, TokenBucket
+
+
+def test_oversized_amount_waits_for_full_bucket():
+    bucket = TokenBucket(600)
+    bucket.level = 0.0
+    assert bucket.wait_time(550, reserve=0.2) == 60.0
+    bucket.level = 600.0
+    assert bucket.wait_time(550, reserve=0.2) == 0.0
+
+
+def test_oversized_background_request_does_not_block_queue():
+    limiter = RateLimiter(tpm=6000, interactive_reserve=0.1)
+    done = []
+
+    def acquire(tokens):
+        limiter.acquire(tokens, PRIORITY_BACKGROUND)
+        done.append(tokens)
+
+    big = threading.Thread(target=acquire, args=(5500,), daemon=True)
+    big.start()
+    big.join(2)
+    small = threading.Thread(target=acquire, args=(10,), daemon=True)
+    small.start()
+    started = time.monotonic()
+    small.join(5)
+    assert done == [5500, 10]
+    assert time.monotonic() - started < 5
@@ -0,0 +1,32 @@
+import hashlib
+import os
+import threading
+
+from llmath_video.storage import ContentIndex, VideoStore
+
+
+def test_concurrent_identical_uploads_keep_one_copy(tmp_path):
+    video_dir = tmp_path / "video"
+    video_dir.mkdir()
+    index = ContentIndex(str(tmp_path / "state" / "content.sqlite3"), str(video_dir))
+    store = VideoStore(str(video_dir), [".mp4"], index)
+    data = os.urandom(4096)
+    sha256 = hashlib.sha256(data).hexdigest()
+    barrier = threading.Barrier(6)
+    results = []
+
+    def upload(i):
+        part = video_dir / f".upload-{i}.part"
+        part.write_bytes(data)
+        barrier.wait()
+        results.append(store.commit_upload(str(part), "lecture.mp4", sha256))
+
+    threads = [threading.Thread(target=upload, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert os.listdir(video_dir) == ["lecture.mp4"]
+    assert {r.name for r in results} == {"lecture.mp4"}
+    assert sum(r.duplicate for r in results) == 5